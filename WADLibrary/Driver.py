@@ -2,6 +2,8 @@
 import subprocess
 import os
 import psutil
+from robot.api import logger
+from .common.sampler import ResourceSampler
 
 
 class Driver:
@@ -9,6 +11,8 @@ class Driver:
         self.f = open(os.devnull, 'w')
         self.process = None
         self.driver_path = driver_path
+        self.sampler = None
+        self.sampler_export = None
 
     def set_up_driver(self, path=None):
         """Starts the Windows Application Driver as a subprocess.
@@ -28,8 +32,63 @@ class Driver:
         self.process = subprocess.Popen([path], startupinfo=si, creationflags=subprocess.CREATE_NEW_CONSOLE)
 
     def tear_down_driver(self):
-        """Stops the Windows Application Driver."""
+        """Stops the Windows Application Driver.
+
+        A running resource sampler is stopped too, see Stop Resource Sampler.
+        """
+        if self.sampler is not None:
+            self.stop_resource_sampler()
         process = psutil.Process(self.process.pid)
         for pro in process.children(recursive=True):
             pro.kill()
         process.kill()
+
+    def start_resource_sampler(self, *processes, interval=1.0, capacity=3600, export_path=None):
+        """Starts sampling CPU, memory, handle and thread counts in the background.
+
+        The driver process tree, the given application processes and the whole host are sampled.
+        Only the newest samples, as many as capacity, are kept.
+
+        Arguments detailed:
+        | =Argument=  | =Input=                                                           |
+        | *processes  | Process names of the applications under test, e.g. calc.exe      |
+        | interval    | Seconds between samples                                           |
+        | capacity    | Number of samples kept                                            |
+        | export_path | File where the time series is written when sampling stops         |
+
+        | =Return=    | =Output=                                                          |
+        | None        | None                                                              |
+        """
+        if self.sampler is not None:
+            self.sampler.stop()
+        driver_pid = self.process.pid if self.process is not None else None
+        self.sampler = ResourceSampler(driver_pid, processes, interval, capacity)
+        self.sampler_export = export_path
+        self.sampler.start()
+
+    def stop_resource_sampler(self, export_path=None):
+        """Stops the resource sampler, logs a summary and optionally exports the time series.
+
+        The time series is written as JSON if the file name ends with .json and as CSV otherwise.
+
+        Arguments detailed:
+        | =Argument=  | =Input=                                                           |
+        | export_path | File for the time series, by default the one given when starting  |
+
+        | =Return=    | =Output=                                                          |
+        | summary     | Minimum, mean and maximum of every metric for every process group |
+        """
+        sampler = self.sampler
+        if sampler is None:
+            return None
+        self.sampler = None
+        sampler.stop()
+        export_path = export_path or self.sampler_export
+        if export_path:
+            sampler.export(export_path)
+        summary = sampler.summary()
+        for group in sorted(summary):
+            logger.info(group + ': ' + ', '.join('%s %.1f/%.1f/%.1f' % (metric, values['min'], values['mean'],
+                                                                       values['max'])
+                                                for metric, values in summary[group].items()))
+        return summary
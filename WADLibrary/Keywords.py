@@ -1,18 +1,90 @@
+import hashlib
 import json
-from .Sessions import Sessions
+import math
+import re
+from contextlib import nullcontext
+from robot.api import logger
+from .Sessions import Sessions, SessionRegistry
 from .common.keys import keys
 from .common import execute
+from .common import locator as locators
+from .common import uitree
+from .common.deadline import deadline
+from .common.elements import ElementCollection
+from .common.errors import Error, DeadlineExceeded, DeferredCommandError
+from .common.geometry import GeometryCache, parse_rect
+from .common.memo import ReadCache
+from .common.planner import QueryPlanner, ATTRIBUTE_STRATEGIES
+from .common.profiler import profiler
+from .common.pool import run_concurrently
+from .common.repository import LocatorRepository
+from .common.retry import RetryPolicy
+from .common.scheduler import EndpointScheduler, record_request
+from .common.stats import stats
+from .common.trace import tracer
+import threading
 import time
 
+MOUSE_BUTTONS = {'left': 0, 'middle': 1, 'right': 2}
+# Element reference key used by W3C WebDriver
+W3C_ELEMENT = 'element-6066-11e4-a52e-4f735466cecf'
+# WebDriver statuses meaning unknown command and unsupported operation
+UNSUPPORTED_STATUSES = (9, 405)
+# WebDriver statuses meaning no such session and no such window
+DEAD_SESSION_STATUSES = (6, 23)
+# Marks a value that could not be read because the element was not found
+MISSING = object()
+# Names of UI Automation attributes, e.g. Name or Value.Value, as accepted for predicates
+ATTRIBUTE_NAME = re.compile(r'^[A-Za-z][\w.]*$')
+
+
+def _compare_to_range(target, first, last):
+    """Returns -1, 0 or 1 as target comes before, within or after the values first to last."""
+    try:
+        target, first, last = float(target), float(first), float(last)
+    except (TypeError, ValueError):
+        target, first, last = str(target), str(first), str(last)
+    # In a list sorted in descending order, smaller values come later
+    direction = -1 if first > last else 1
+    if target < min(first, last):
+        return -direction
+    if target > max(first, last):
+        return direction
+    return 0
+
 
 class Keywords:
     def __init__(self, path, platform, device_name, timeout):
-        self.__sessions = []
-        self.__current_session = None
+        self.__sessions = SessionRegistry()
+        # Current session of each thread, falling back to the one of the thread that set up the library
+        self.__context = threading.local()
+        self.__default_session = None
         self.__platform = platform
+        self._scheduler = None
+        if isinstance(path, (list, tuple)) or ',' in path:
+            self._scheduler = EndpointScheduler(path)
+            if record_request not in execute.listeners:
+                execute.listeners.append(record_request)
+            path = self._scheduler.endpoints[0].url
         self.path = path
         self.device_name = device_name
         self.timeout = timeout
+        self._read_cache = ReadCache()
+        # Whether the driver supports single-request clicks, None until first tried
+        self._click_support = {'element': None, 'actions': None}
+        self._repository = None
+        self._trace_path = None
+        self._profile_directory = None
+        # Last page source snapshot of each session, parsed for Get UI Changes
+        self._ui_snapshots = {}
+        self._planner = QueryPlanner()
+        # Page each list was left at by Scroll To Item, keyed by session and list locator chain
+        self._scroll_positions = {}
+        self._geometry = GeometryCache()
+        # Ids of the sessions Reset WADLibrary State keeps
+        self._checkpoint = set()
+        self._root_id = None
+        self._session_gc = {'max_sessions': None, 'interval': None, 'last': time.time()}
 
     def set_up(self):
         """Sets up a new session for WinAppDriver.
@@ -20,14 +92,23 @@ class Keywords:
         Starts by first defining the required capabilities, such as platform, device name
         or any experimental flags. Then, creates an initial session called Root for the main Desktop window.
         In WAD, sessions represent different application top-level windows.
+
+        When the library was given several driver endpoints, the least loaded healthy one is
+        chosen, and all sessions of this set up stay on it. Sessions other processes have on the
+        driver are registered too, but the Root session created here becomes the current one.
         """
+        if self._scheduler is not None:
+            self.path = self._scheduler.acquire()
         desired_caps = dict()
         desired_caps["app"] = 'Root'
         desired_caps["platformName"] = self.__platform
         desired_caps["deviceName"] = self.device_name
         desired_caps["ms:experimental-webdriver"] = True
 
-        execute.post(self.path + '/session/', json={'desiredCapabilities': desired_caps})
+        self._read_cache.clear()
+        res = execute.post(self.path + '/session/', json={'desiredCapabilities': desired_caps})
+        # Other processes may have Root sessions on the same driver, the one created here is ours
+        self._root_id = json.loads(res.text).get('sessionId')
 
         res = execute.get(self.path + '/sessions')
         json_obj = json.loads(res.text)
@@ -39,16 +120,19 @@ class Keywords:
             elif 'app' in cap:
                 app_name = cap['app']
             session_obj = Sessions(session_id=session_id, name=app_name, desired_caps=cap)
-            self.__sessions.append(session_obj)
-        ses = self.get_session('Root')
-        self.__current_session = ses
+            self.__sessions.add(session_obj)
+            if self._scheduler is not None:
+                self._scheduler.bind(session_id, self.path)
+        stats.set_max('sessions_high_water', self.__sessions.high_water)
+        ses = self._root_session()
+        self.__default_session = ses
+        self._set_current(ses)
+        self.set_wadlibrary_checkpoint()
 
     def clean_up(self):
         """Removes all sessions."""
-        for_deletion = self.__sessions
-        for session in self.__sessions:
+        for session in self.__sessions.all():
             self.delete_session(session.get_id())
-        for session in for_deletion:
             self.__sessions.remove(session)
 
     def clean_up_session(self, name):
@@ -64,18 +148,19 @@ class Keywords:
 
     def get_sessions(self):
         """Returns all sessions."""
-        return self.__sessions
+        return self.__sessions.all()
 
     def get_current_session_id(self):
-        """Returns currently active session."""
-        return self.__current_session.get_id()
+        """Returns currently active session.
+
+        Each thread has its own current session. Threads that have not set one use the session
+        that was current when the library was set up.
+        """
+        return self._get_current().get_id()
 
     def get_session_ids(self):
         """Returns identifiers for all sessions."""
-        ids = []
-        for session in self.__sessions:
-            ids.append(session.get_id())
-        return ids
+        return self.__sessions.ids()
 
     def get_session(self, name):
         """Returns session for specified name.
@@ -84,15 +169,57 @@ class Keywords:
         | =Argument= | =Input=                              |
         | name       | Name of the session to be retrieved. |
         """
-        for session in self.__sessions:
-            if name == session.get_name():
-                return session
+        return self.__sessions.by_name(name)
 
     def get_session_by_id(self, session_id):
         """Returns session for specified id."""
-        for session in self.__sessions:
-            if session_id == session.get_id():
-                return session
+        return self.__sessions.by_id(session_id)
+
+    def prune_sessions(self):
+        """Removes sessions whose windows have been closed.
+
+        Every session except Root is checked with a cheap window handle request, in parallel.
+        Sessions whose window no longer exists are deleted on the driver and removed from the library.
+        If the current session is removed, Root becomes the current session.
+
+        | =Return=   | =Output=                          |
+        | pruned     | Number of sessions removed        |
+        """
+        candidates = [session for session in self.__sessions.all() if session.get_name() != 'Root']
+        alive = run_concurrently(self._is_session_alive, candidates)
+        dead = [session for session, is_alive in zip(candidates, alive) if not is_alive]
+        for session in dead:
+            self._drop_session(session)
+        self._session_gc['last'] = time.time()
+        stats.increment('sessions_pruned', len(dead))
+        return len(dead)
+
+    def set_wadlibrary_checkpoint(self):
+        """Marks the current sessions as the ones Reset WADLibrary State keeps.
+
+        Set Up sets a checkpoint of the Root session automatically.
+        """
+        self._checkpoint = set(self.__sessions.ids())
+
+    def configure_session_gc(self, max_sessions=None, interval=None):
+        """Configures automatic removal of sessions when windows are attached.
+
+        When interval is set, sessions of closed windows are pruned at most once per interval when
+        attaching to a window. When max_sessions is set and attaching would exceed it, closed sessions are
+        pruned and then the least recently used sessions are deleted on the driver until the limit is met.
+        Root, the current session and the newly attached session are never evicted. Evicting a session
+        does not close its window.
+
+        Arguments detailed:
+        | =Argument=   | =Input=                                              |
+        | max_sessions | Maximum number of sessions, or None for no limit     |
+        | interval     | Seconds between automatic prunes, or None to disable |
+
+        | =Return=     | =Output=                                             |
+        | None         | None                                                 |
+        """
+        self._session_gc['max_sessions'] = None if max_sessions is None else int(max_sessions)
+        self._session_gc['interval'] = None if interval is None else float(interval)
 
     def get_window_handle(self, using, value, session_id=None):
         """Searches for a window and returns a handle for it.
@@ -109,7 +236,7 @@ class Keywords:
         if session_id is None:
             session_id = self.get_current_session_id()
         elem = self.find_element(using=using, value=value, session_id=session_id)
-        win = execute.get(self.path + '/session/' + session_id + '/element/' + elem + '/attribute/NativeWindowHandle')
+        win = execute.get(self._session_url(session_id) + '/element/' + elem + '/attribute/NativeWindowHandle')
         json_obj = json.loads(win.text)
         handle = hex(int(json_obj['value']))
         return handle
@@ -134,12 +261,15 @@ class Keywords:
         desired_caps["appTopLevelWindow"] = window_handle
         desired_caps["platformName"] = self.__platform
         desired_caps["deviceName"] = self.device_name
-        self.__current_session = self._create_session(desired_caps, name)
+        self._set_current(self._create_session(desired_caps, name, self._endpoint(session_id)))
         self.get_sessions()
 
     def close_window(self, session_id=None):
         """Closes window of specified session.
 
+        Closing a window can change what other sessions see, e.g. the desktop of the Root session, so
+        the read cache of every session is cleared.
+
         Arguments detailed:
         | =Argument=  | =Input=                             |
         | session_id  | Session which window will be closed |
@@ -149,7 +279,9 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        execute.delete(self.path + '/session/' + session_id + '/window')
+        self._read_cache.clear()
+        self._geometry.forget(session_id)
+        execute.delete(self._session_url(session_id) + '/window')
 
     def maximize_window(self, session_id=None):
         """Maximizes window of specified session.
@@ -163,7 +295,9 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        execute.post(self.path + '/session/' + session_id + '/window/maximize')
+        self._read_cache.clear()
+        self._geometry.forget(session_id)
+        execute.post(self._session_url(session_id) + '/window/maximize', deferred=True)
 
     def minimize_window(self, session_id=None):
         """Minimizes window of specified session.
@@ -177,7 +311,9 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        execute.post(self.path + '/session/' + session_id + '/window/minimize')
+        self._read_cache.clear()
+        self._geometry.forget(session_id)
+        execute.post(self._session_url(session_id) + '/window/minimize', deferred=True)
 
     def delete_session(self, session_id):
         """Deletes specified session.
@@ -189,7 +325,16 @@ class Keywords:
         | =Return=    | =Output=                            |
         | None        | None                                |
         """
-        execute.delete(self.path + '/session/' + session_id)
+        self._read_cache.clear(session_id)
+        execute.delete(self._session_url(session_id, touch=False))
+        if self._scheduler is not None:
+            self._scheduler.release(session_id)
+        if self._repository is not None:
+            self._repository.forget(session_id)
+        self._ui_snapshots.pop(session_id, None)
+        self._geometry.forget(session_id)
+        for key in [key for key in self._scroll_positions if key[0] == session_id]:
+            del self._scroll_positions[key]
 
     def set_current_session(self, name):
         """Sets specified session to active.
@@ -201,7 +346,8 @@ class Keywords:
         | =Return=   | =Output=                   |
         | None       | None                       |
         """
-        self.__current_session = self.get_session(name)
+        self._read_cache.clear()
+        self._set_current(self.get_session(name))
 
     def set_focus(self, session_id=None):
         """Sets a session's window to the foreground
@@ -221,7 +367,27 @@ class Keywords:
         elif 'app' in caps:
             app_name = caps['app']
         json_obj = {'name': app_name}
-        execute.post(self.path + '/session/' + session_id + '/window', json=json_obj)
+        self._read_cache.clear()
+        self._geometry.forget_window(session_id)
+        execute.post(self._session_url(session_id) + '/window', json=json_obj, deferred=True)
+
+    def compile_locator(self, locator, using=None):
+        """Parses and validates an element locator so it can be reused without re-parsing.
+
+        The returned locator can be given to any keyword in place of a locator string, which
+        avoids parsing the locator on every call, e.g. inside wait loops.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                                              |
+        | locator    | Locator as "locator_type:locator", or only the value if using is set |
+        | using      | Type of element locator                                              |
+
+        | =Return=   | =Output=                                                             |
+        | locator    | Compiled locator                                                     |
+        """
+        if using is None:
+            return locators.parse(locator)
+        return locators.resolve(locator, using)
 
     def find_element(self, value, using='name', session_id=None):
         """Searches for element in the current session's window.
@@ -237,12 +403,41 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        res = execute.post(self.path + '/session/' + session_id + '/element',
-                           json={'using': using, 'sessionId': session_id, 'value': value})
+        loc = locators.resolve(value, using)
+        if loc.using == 'xpath' and self._planner.enabled:
+            return self._find_by_xpath(loc, session_id)
+        res = execute.post(self._session_url(session_id) + '/element', json=loc.as_json(session_id),
+                           idempotent=True)
         json_obj = json.loads(res.text)
         elem = json_obj['value']['ELEMENT']
         return elem
 
+    def enable_xpath_planner(self):
+        """Rewrites XPath locators into chains of cheaper lookups where possible.
+
+        XPath makes Windows Application Driver walk the whole tree of the window, which can take seconds
+        in the Root session or in large windows. With the planner enabled, XPath locators made of
+        descendant steps, such as //Button[@Name='OK'] or /Window[@AutomationId='x']//Edit, are found
+        with chained accessibility id, name, class name or tag name lookups instead. The tag and any
+        other predicates of each step are checked on the element found.
+
+        The time each lookup strategy takes is recorded and the cheapest one is used for later steps.
+        Queries the rewrite does not find, or that turn out slower than XPath, are sent as XPath.
+        """
+        self._planner.enabled = True
+
+    def disable_xpath_planner(self):
+        """Sends XPath locators to the driver as they are."""
+        self._planner.enabled = False
+
+    def get_xpath_planner_statistics(self):
+        """Returns the observed cost of each lookup strategy and of each XPath query.
+
+        | =Return=   | =Output=                                                          |
+        | statistics | Dictionary with the mean time per strategy and per query and kind |
+        """
+        return self._planner.statistics()
+
     def find_element_children(self, *args, session_id=None):
         """
         Finds all children for specified chain of elements.
@@ -257,19 +452,18 @@ class Keywords:
         | session_id   | Session where all elements are searched from                                   |
 
         | =Return=     | =Output=                                                                       |
-        | children     | List of child elements from the last level of the hierarchy, matching criteria |
+        | children     | Collection of child elements from the last level of the hierarchy              |
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        parent_using, parent_value = args[0].split(":", 1)
-        parent_elem = self.find_element(value=parent_value, using=parent_using, session_id=session_id)
-        for i in range(1, len(args)):
-            child_using, child_value = args[i].split(":", 1)
-            res = execute.post(self.path + '/session/' + session_id + '/element/' +
+        chain = locators.parse_chain(args)
+        parent_elem = self.find_element(value=chain[0], session_id=session_id)
+        for child in chain[1:]:
+            res = execute.post(self._session_url(session_id) + '/element/' +
                                parent_elem + '/elements/',
-                               json={'using': child_using, 'sessionid': session_id, 'value': child_value})
+                               json=child.as_json(session_id), idempotent=True)
         json_obj = json.loads(res.text)
-        children = json_obj['value']
+        children = ElementCollection(json_obj['value'], self._session_url(session_id))
         return children
 
     def find_child_element(self, *args, session_id=None):
@@ -290,16 +484,16 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        parent_using, parent_value = args[0].split(":", 1)
-        parent_elem = self.find_element(value=parent_value, using=parent_using, session_id=session_id)
-        for i in range(1, len(args)):
-            child_using, child_value = args[i].split(":", 1)
-            res = execute.post(self.path + '/session/' + session_id + '/element/' +
-                               parent_elem + '/element/',
-                               json={'using': child_using, 'sessionid': session_id, 'value': child_value})
+        chain = locators.parse_chain(args)
+        with tracer.span('find_child_element', 'helper', session_id=session_id, depth=len(chain)):
+            parent_elem = self.find_element(value=chain[0], session_id=session_id)
+            for child in chain[1:]:
+                res = execute.post(self._session_url(session_id) + '/element/' +
+                                   parent_elem + '/element/',
+                                   json=child.as_json(session_id), idempotent=True)
 
-            json_obj = json.loads(res.text)
-            parent_elem = json_obj['value']['ELEMENT']
+                json_obj = json.loads(res.text)
+                parent_elem = json_obj['value']['ELEMENT']
         last_child = parent_elem
         return last_child
 
@@ -323,8 +517,7 @@ class Keywords:
         if session_id is None:
             session_id = self.get_current_session_id()
         elem = self.find_child_element(*args, session_id=session_id)
-        self._move_to_element(elem, session_id)
-        self._mouse_click(button, session_id)
+        self._click_elem(elem, button, session_id=session_id)
 
     def click_ith_child_element(self, *args, index=0, button='left', session_id=None):
 
@@ -349,8 +542,149 @@ class Keywords:
             session_id = self.get_current_session_id()
         children = self.find_element_children(*args, session_id=session_id)
         elem = children[index]['ELEMENT']
-        self._move_to_element(elem, session_id)
-        self._mouse_click(button, session_id)
+        self._click_elem(elem, button, session_id=session_id)
+
+    def find_children_where(self, *args, sort_by=None, descending=False, session_id=None, **predicates):
+        """
+        Finds the children of a chain of elements whose attributes match all given predicates.
+
+        The chain is given as in Find Element Children. Predicates are given as named arguments
+        attribute=expected, e.g. Name=Invoice 42. The expected value matches exactly, as a glob
+        pattern when it contains * or ?, or as a regular expression when prefixed with regexp:.
+        Attributes are fetched in parallel for all children.
+
+        Robot Framework passes any argument containing = as a named argument, so an = in a locator
+        of the chain has to be escaped as \\=, e.g. xpath://List[@Name\\='Invoices']. Predicates
+        whose name is not an attribute name are rejected.
+
+        Arguments detailed:
+        | =Argument=    | =Input=                                                            |
+        | *args         | All positional arguments, interpreted as locator_type:locator      |
+        | sort_by       | Attribute to sort the matching children by                         |
+        | descending    | Whether to sort in descending order                                |
+        | session_id    | Session where all elements are searched from                       |
+        | **predicates  | Attribute predicates the children must match                       |
+
+        | =Return=      | =Output=                                                           |
+        | children      | Collection of matching child elements                              |
+        """
+        if session_id is None:
+            session_id = self.get_current_session_id()
+        for name in predicates:
+            if not ATTRIBUTE_NAME.match(name):
+                raise Error("'%s=%s' is not an attribute predicate, escape = in locators as \\=" %
+                            (name, predicates[name]))
+        children = self.find_element_children(*args, session_id=session_id)
+        if predicates:
+            children = children.filter(**predicates)
+        if sort_by:
+            children = children.sort_by(sort_by, reverse=descending)
+        return children
+
+    def get_children_attribute(self, *args, attribute='Name', session_id=None):
+        """
+        Returns an attribute of every child for specified chain of elements.
+
+        The chain is given as in Find Element Children. The attribute is fetched in parallel for all children.
+
+        Arguments detailed:
+        | =Argument=  | =Input=                                                       |
+        | *args       | All positional arguments, interpreted as locator_type:locator |
+        | attribute   | Attribute to query for each child                             |
+        | session_id  | Session where all elements are searched from                  |
+
+        | =Return=    | =Output=                                                      |
+        | values      | List of attribute values in the order of the children         |
+        """
+        return self.find_element_children(*args, session_id=session_id).values(attribute)
+
+    def click_child_where(self, *args, button='left', sort_by=None, descending=False, session_id=None,
+                          **predicates):
+        """
+        Clicks the first child of a chain of elements whose attributes match all given predicates.
+
+        For example, Click Child Where  name:Invoices  Name=Invoice 42  clicks the row named Invoice 42.
+        Predicates and sorting work as in Find Children Where, including escaping = in locators as \\=.
+
+        Arguments detailed:
+        | =Argument=    | =Input=                                                            |
+        | *args         | All positional arguments, interpreted as locator_type:locator      |
+        | button        | Mouse button used                                                  |
+        | sort_by       | Attribute to sort the matching children by before picking one      |
+        | descending    | Whether to sort in descending order                                |
+        | session_id    | Session where all elements are searched from                       |
+        | **predicates  | Attribute predicates the child must match                          |
+
+        | =Return=      | =Output=                                                           |
+        | None          | None                                                               |
+        """
+        if session_id is None:
+            session_id = self.get_current_session_id()
+        children = self.find_children_where(*args, sort_by=sort_by, descending=descending,
+                                            session_id=session_id, **predicates)
+        elem = children.first()
+        if elem is None:
+            raise AssertionError("No child of '%s' matched %s" % (args[-1], predicates))
+        self._click_elem(elem, button, session_id=session_id)
+
+    def scroll_to_item(self, *args, item, sorted_by=None, target=None, rows='tag name:ListItem', max_pages=500,
+                       session_id=None):
+        """Scrolls a virtualized list or grid until an item is realized and returns the item.
+
+        Virtualized lists only contain the items currently on screen, so items further down cannot be
+        found before the list has been scrolled to them. The list is scrolled with PAGE_DOWN and PAGE_UP
+        keys, several of them in one request when jumping over many pages. If the list supports the
+        scroll pattern, its scroll position and view size tell where the list is and how many pages
+        it has.
+
+        With sorted_by, the list is assumed to be sorted by that attribute and is searched by bisection:
+        the first and last visible rows, found with the rows locator, tell whether the item comes before
+        or after the page shown. Values are compared as numbers when both are numbers. Without sorted_by
+        the pages are searched one by one.
+
+        The page each list was left at is remembered, and the next search in the same list starts there.
+
+        Example:
+        | ${row}= | Scroll To Item | accessibility id:Orders | item=name:Order 4711 | sorted_by=Name |
+        | Click Element | ${row} |
+
+        Arguments detailed:
+        | =Argument= | =Input=                                                               |
+        | *args      | Chain of locators to the list, interpreted as locator_type:locator    |
+        | item       | Locator of the item inside the list, as locator_type:locator          |
+        | sorted_by  | Attribute the list is sorted by, enables bisection                    |
+        | target     | Value of sorted_by to look for, by default the value of item          |
+        | rows       | Locator matching the rows of the list, e.g. tag name:DataItem         |
+        | max_pages  | Maximum number of pages visited before giving up                      |
+        | session_id | Session where all elements are searched from                          |
+
+        | =Return=   | =Output=                                                              |
+        | elem       | Element identifier of the item                                        |
+        """
+        if session_id is None:
+            session_id = self.get_current_session_id()
+        chain = locators.parse_chain(args)
+        item_loc = locators.parse(item)
+        list_elem = self.find_child_element(*chain, session_id=session_id)
+        elem = self._find_in(list_elem, item_loc, session_id)
+        if elem is not None:
+            return elem
+        state = self._scroll_positions.setdefault((session_id, chain), {'page': 0})
+        geometry = self._scroll_geometry(list_elem, session_id)
+        pages = None
+        if geometry is not None:
+            state['page'], pages = geometry
+        search = {'list': list_elem, 'item': item_loc, 'rows': locators.parse(rows), 'state': state,
+                  'absolute': geometry is None, 'pages': pages, 'probes': 0, 'max_pages': int(max_pages),
+                  'session_id': session_id}
+        if sorted_by is None:
+            elem = self._scan_pages(search)
+        else:
+            elem = self._bisect_pages(search, sorted_by, item_loc.value if target is None else target)
+        logger.info('Visited %d pages of the list' % search['probes'])
+        if elem is None:
+            raise AssertionError("Item '%s' was not found in '%s'" % (item, args[-1]))
+        return elem
 
     def double_click_child_recursively(self, *args, session_id=None):
         """
@@ -371,8 +705,7 @@ class Keywords:
         if session_id is None:
             session_id = self.get_current_session_id()
         elem = self.find_child_element(*args, session_id=session_id)
-        self._move_to_element(elem, session_id)
-        self.double_click(session_id)
+        self._click_elem(elem, count=2, session_id=session_id)
 
     def double_click_ith_child_element(self, *args, index=0, session_id=None):
 
@@ -396,8 +729,7 @@ class Keywords:
             session_id = self.get_current_session_id()
         children = self.find_element_children(*args, session_id=session_id)
         elem = children[index]['ELEMENT']
-        self._move_to_element(elem, session_id)
-        self.double_click(session_id)
+        self._click_elem(elem, count=2, session_id=session_id)
 
     def double_click(self, session_id=None):
         """Double clicks the left mouse button.
@@ -411,7 +743,8 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        execute.post(self.path + '/session/' + session_id + '/doubleclick')
+        self._read_cache.clear()
+        execute.post(self._session_url(session_id) + '/doubleclick')
 
     def double_click_element(self, value, using='name', session_id=None):
         """Double clicks specified element.
@@ -429,8 +762,7 @@ class Keywords:
         if session_id is None:
             session_id = self.get_current_session_id()
         elem = self.find_element(value=value, using=using, session_id=session_id)
-        self._move_to_element(elem=elem, session_id=session_id)
-        self.double_click(session_id=session_id)
+        self._click_elem(elem, count=2, session_id=session_id)
 
     def click_element(self, value, using='name', button='left', session_id=None):
         """Finds element and clicks on it.
@@ -447,9 +779,15 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        elem = self.find_element(value=value, using=using, session_id=session_id)
-        self._move_to_element(elem=elem, session_id=session_id)
-        self._mouse_click(button=button, session_id=session_id)
+        if self._geometry.enabled:
+            loc = locators.resolve(value, using)
+            if self._click_cached_geometry(loc, button, session_id):
+                return
+            elem = self.find_element(value=loc, session_id=session_id)
+            self._remember_geometry(loc, elem, session_id)
+        else:
+            elem = self.find_element(value=value, using=using, session_id=session_id)
+        self._click_elem(elem, button, session_id=session_id)
 
     def move_mouse_to_element(self, value, using='name', session_id=None):
         """Moves mouse to specified element.
@@ -501,7 +839,8 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        execute.post(self.path + '/session/' + session_id + '/keys', json={'value': list(value)})
+        self._read_cache.clear()
+        execute.post(self._session_url(session_id) + '/keys', json={'value': list(value)}, deferred=True)
 
     def send_key(self, value, session_id=None):
         """Sends a single keyboard key.
@@ -519,7 +858,8 @@ class Keywords:
 
         key = keys(value)
 
-        execute.post(self.path + '/session/' + session_id + '/keys', json={'value': [key]})
+        self._read_cache.clear()
+        execute.post(self._session_url(session_id) + '/keys', json={'value': [key]}, deferred=True)
 
     def enter_value(self, value, locator, using='name', session_id=None):
         """Inputs value to specified input element
@@ -537,7 +877,8 @@ class Keywords:
         if session_id is None:
             session_id = self.get_current_session_id()
         elem = self.find_element(locator, using, session_id)
-        execute.post(self.path + '/session/' + session_id + '/element/' + elem + '/value',
+        self._read_cache.clear()
+        execute.post(self._session_url(session_id) + '/element/' + elem + '/value',
                      json={'value': list(value)})
 
     def is_element_enabled(self, value, using='name', session_id=None):
@@ -553,13 +894,20 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        try:
-            elem = self.find_element(value=value, using=using, session_id=session_id)
-        except:
-            return
-        res = execute.get(self.path + '/session/' + session_id + '/element/' + elem + '/enabled')
-        json_obj = json.loads(res.text)
-        enabled = json_obj['value']
+        loc = locators.resolve(value, using)
+
+        def fetch():
+            try:
+                elem = self.find_element(value=loc, session_id=session_id)
+            except (DeadlineExceeded, DeferredCommandError):
+                raise
+            except:
+                return
+            res = execute.get(self._session_url(session_id) + '/element/' + elem + '/enabled')
+            json_obj = json.loads(res.text)
+            return json_obj['value']
+
+        enabled = self._read_cache.lookup((session_id, 'enabled', loc), fetch)
         return enabled
 
     def get_element_attribute(self, locator, attribute='Name', using='name', session_id=None):
@@ -580,12 +928,13 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        elem = self.find_element(value=locator, using=using, session_id=session_id)
-        res = execute.get(self.path + '/session/' + session_id + '/element/' + elem +
-                          '/attribute/' + attribute)
-        json_obj = json.loads(res.text)
-        attribute = json_obj['value']
-        return attribute
+        loc = locators.resolve(locator, using)
+
+        def fetch():
+            elem = self.find_element(value=loc, session_id=session_id)
+            return self._get_attribute_for_elem(elem, attribute, session_id)
+
+        return self._read_cache.lookup((session_id, 'attribute', loc, attribute), fetch)
 
     def get_element_value(self, locator, using='name', session_id=None):
         """Retrieves the value of an element.
@@ -622,10 +971,379 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        child_elem = self.find_child_element(*args, session_id=session_id)
-        attribute = self._get_attribute_for_elem(child_elem, child_attribute, session_id)
+        chain = locators.parse_chain(args)
+
+        def fetch():
+            child_elem = self.find_child_element(*chain, session_id=session_id)
+            return self._get_attribute_for_elem(child_elem, child_attribute, session_id)
+
+        attribute = self._read_cache.lookup((session_id, 'attribute', chain, child_attribute), fetch)
         return attribute
 
+    ####################################################################################################################
+    # Locator repository
+    ####################################################################################################################
+
+    def load_locator_repository(self, path):
+        """Loads locators grouped by screen from a JSON or YAML file.
+
+        The file maps screen names to locator names to locators. A locator is a "locator_type:locator"
+        string or a list of them forming a chain, as in the chain keywords. YAML files require PyYAML.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                  |
+        | path       | Path of the .json, .yaml or .yml file    |
+
+        | =Return=   | =Output=                                 |
+        | None       | None                                     |
+        """
+        self._repository = LocatorRepository.load(path)
+
+    def prefetch_screen(self, screen, session_id=None):
+        """Resolves all locators of a screen in parallel and caches the elements they point to.
+
+        Locators that do not match any element are skipped and resolved again on first use.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                  |
+        | screen     | Name of the screen in the repository     |
+        | session_id | Session where elements are searched from |
+
+        | =Return=   | =Output=                                 |
+        | resolved   | Number of locators that were resolved    |
+        """
+        if session_id is None:
+            session_id = self.get_current_session_id()
+        repository = self._get_repository()
+
+        def resolve(locator):
+            try:
+                return self._resolve_screen_locator(locator, session_id)
+            except (DeadlineExceeded, DeferredCommandError):
+                raise
+            except Error:
+                logger.info("Locator '%s' of screen '%s' did not match any element" % (locator.name, screen))
+                return None
+
+        elements = run_concurrently(resolve, repository.screen(screen))
+        return len([elem for elem in elements if elem is not None])
+
+    def get_screen_element(self, screen, name, session_id=None):
+        """Returns the element a repository locator points to, resolving it on first use.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                  |
+        | screen     | Name of the screen in the repository     |
+        | name       | Name of the locator in the screen        |
+        | session_id | Session where element is searched from   |
+
+        | =Return=   | =Output=                                 |
+        | elem       | Element identifier                       |
+        """
+        if session_id is None:
+            session_id = self.get_current_session_id()
+        return self._resolve_screen_locator(self._get_repository().get(screen, name), session_id)
+
+    def click_screen_element(self, screen, name, button='left', session_id=None):
+        """Clicks the element a repository locator points to.
+
+        If the cached element no longer exists, the locator is resolved again and the click retried once.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                  |
+        | screen     | Name of the screen in the repository     |
+        | name       | Name of the locator in the screen        |
+        | button     | Mouse button used                        |
+        | session_id | Session where element is located         |
+
+        | =Return=   | =Output=                                 |
+        | None       | None                                     |
+        """
+        if session_id is None:
+            session_id = self.get_current_session_id()
+        elem = self.get_screen_element(screen, name, session_id)
+        try:
+            self._click_elem(elem, button, session_id=session_id)
+        except (DeadlineExceeded, DeferredCommandError):
+            raise
+        except Error:
+            self._repository.forget(session_id, screen, name)
+            elem = self.get_screen_element(screen, name, session_id)
+            self._click_elem(elem, button, session_id=session_id)
+
+    def get_locator_timings(self):
+        """Returns how long resolving each repository locator took, slowest first.
+
+        Each entry holds the screen, name and locator, the number of resolutions, and the last
+        and mean resolution time in seconds.
+
+        | =Return=   | =Output=                                            |
+        | timings    | List of dictionaries, one for each resolved locator |
+        """
+        timings = self._get_repository().timings()
+        for entry in timings:
+            logger.info('%s.%s: %.3f s mean over %d resolutions' % (entry['screen'], entry['name'],
+                                                                     entry['mean_time'], entry['resolutions']))
+        return timings
+
+    ####################################################################################################################
+    # Transport and statistics
+    ####################################################################################################################
+
+    def start_trace(self, path=None, capacity=200000):
+        """Starts recording a timeline of keywords, internal helpers and requests to the driver.
+
+        The timeline is kept in memory and written in Chrome trace event format by Stop Trace, or by
+        WADLibrary Tear Down if tracing is still on. It can be opened in chrome://tracing or Perfetto.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                                      |
+        | path       | File the trace is written to when tracing stops              |
+        | capacity   | Maximum number of events kept, oldest are dropped first      |
+
+        | =Return=   | =Output=                                                     |
+        | None       | None                                                         |
+        """
+        self._trace_path = path
+        if tracer.record_request not in execute.listeners:
+            execute.listeners.append(tracer.record_request)
+        tracer.start(capacity)
+
+    def stop_trace(self, path=None):
+        """Stops recording the timeline and writes it to a file.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                                      |
+        | path       | File written to, defaults to the path of Start Trace         |
+
+        | =Return=   | =Output=                                                     |
+        | events     | Number of events written                                     |
+        """
+        tracer.stop()
+        if tracer.record_request in execute.listeners:
+            execute.listeners.remove(tracer.record_request)
+        path = path or self._trace_path or 'wadlibrary_trace.json'
+        return tracer.flush(path)
+
+    def start_profiling(self, directory='wadlibrary_profile', sample_interval=0.005):
+        """Starts profiling the CPU time the library itself spends in each keyword.
+
+        Every keyword of the library runs under cProfile with a CPU time clock, so time spent waiting
+        for the driver is not counted. A sampling profiler records stacks for flame graphs, leaving out
+        samples taken while waiting for the network. Results are aggregated per keyword and written by
+        Stop Profiling, or by WADLibrary Tear Down if profiling is still on.
+
+        Arguments detailed:
+        | =Argument=      | =Input=                                                          |
+        | directory       | Directory the pstats and collapsed stack files are written to    |
+        | sample_interval | Seconds between stack samples, 0 to only use cProfile            |
+
+        | =Return=        | =Output=                                                         |
+        | None            | None                                                             |
+        """
+        self._profile_directory = directory
+        profiler.start(sample_interval)
+
+    def stop_profiling(self, directory=None):
+        """Stops profiling and writes a pstats file per keyword and a collapsed stack file.
+
+        The pstats files can be read with python -m pstats or snakeviz, and wadlibrary.collapsed with
+        flamegraph.pl or speedscope. The keywords with the most CPU time are logged.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                                              |
+        | directory  | Directory to write to, by default the one given to Start Profiling   |
+
+        | =Return=   | =Output=                                                             |
+        | files      | Paths of the files written                                           |
+        """
+        profiler.stop()
+        files = profiler.write(directory or self._profile_directory or 'wadlibrary_profile')
+        for name, calls, seconds in profiler.summary():
+            logger.info('%s: %.3f s CPU in %d calls' % (name, seconds, calls))
+        return files
+
+    def configure_retry_policy(self, attempts=3, backoff=0.2, max_backoff=2.0, failure_threshold=5,
+                               reset_timeout=30):
+        """Configures how failed requests to Windows Application Driver are retried.
+
+        Only idempotent requests (queries and element searches) are retried, with a delay that doubles
+        after each try up to max_backoff. Once failure_threshold requests in a row have failed, the circuit
+        breaker of that driver host opens and all requests to it fail immediately for reset_timeout seconds.
+
+        Arguments detailed:
+        | =Argument=        | =Input=                                                   |
+        | attempts          | Total number of tries for an idempotent request           |
+        | backoff           | Delay in seconds before the first retry                   |
+        | max_backoff       | Upper limit in seconds for the delay between tries        |
+        | failure_threshold | Consecutive failures after which the circuit breaker opens |
+        | reset_timeout     | Seconds the circuit breaker stays open                    |
+
+        | =Return=          | =Output=                                                  |
+        | None              | None                                                      |
+        """
+        execute.policy = RetryPolicy(attempts, backoff, max_backoff)
+        execute.breaker_settings = {'failure_threshold': failure_threshold, 'reset_timeout': reset_timeout}
+        execute.reset_breakers()
+
+    def configure_request_timeouts(self, default=20, connect=5, new_session=60, source=30):
+        """Configures how long requests to Windows Application Driver may take.
+
+        These are upper limits: inside wait keywords every request is additionally limited to the
+        time left before the wait times out.
+
+        Arguments detailed:
+        | =Argument=  | =Input=                                                 |
+        | default     | Seconds to wait for a response to any other request     |
+        | connect     | Seconds to wait for a connection to the driver          |
+        | new_session | Seconds to wait for a new session to be created         |
+        | source      | Seconds to wait for the page source of a session        |
+
+        | =Return=    | =Output=                                                |
+        | None        | None                                                    |
+        """
+        execute.DEFAULT_TIMEOUT = float(default)
+        execute.CONNECT_TIMEOUT = float(connect)
+        execute.ENDPOINT_TIMEOUTS = [
+            ('POST', '/session', float(new_session)),
+            ('GET', '/source', float(source)),
+        ]
+
+    def configure_request_coalescing(self, enabled=True):
+        """Configures whether identical reads sent at the same time share one request to the driver.
+
+        When enabled, a read such as an attribute query, element search or session listing that is
+        identical to one already waiting for the driver does not send a request of its own but gets
+        the response of the earlier one. Reads of a session sent before an action on that session
+        are not shared with reads sent after it. Coalescing is disabled by default, since a shared
+        response may still miss changes made by other threads while it was on its way. The number of
+        requests saved is reported as coalesced_requests by Get WADLibrary Statistics.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                     |
+        | enabled    | Whether identical reads are coalesced       |
+
+        | =Return=   | =Output=                                    |
+        | None       | None                                        |
+        """
+        if isinstance(enabled, str):
+            enabled = enabled.lower() not in ('false', 'no', 'off', '0', '')
+        execute.coalesce = bool(enabled)
+
+    def enable_command_pipelining(self):
+        """Sends window, focus and key press commands in the background without waiting for them.
+
+        Maximize Window, Minimize Window, Set Focus, Keyboard Keys and Send Key then return at once and
+        their requests are sent in order by a background thread. Any other request to the driver, such
+        as a read or a click, first waits until the queued commands have been sent. An error of a
+        queued command is raised by the next such request or by Sync Commands.
+        """
+        execute.pipeline.enabled = True
+
+    def disable_command_pipelining(self):
+        """Waits for the queued commands, raising their errors, and sends commands directly again."""
+        try:
+            self.sync_commands()
+        finally:
+            execute.pipeline.enabled = False
+
+    def sync_commands(self):
+        """Waits until all queued commands have been sent and fails if any of them failed."""
+        execute.pipeline.barrier()
+
+    def enable_geometry_cache(self, verify_every=10):
+        """Clicks elements found before by their remembered position instead of finding them again.
+
+        The first Click Element of a locator reads the BoundingRectangle of the element and the position
+        and size of its window. Later clicks of the same locator in the same session click the element's
+        center with one actions request. All positions of a session are forgotten when its window is
+        maximized, minimized or closed, and every verify_every'th click of a locator is checked against
+        the live element and window, forgetting the positions if the window has moved or been resized.
+
+        Use this for static toolbars and menus whose elements do not move within their window.
+
+        Arguments detailed:
+        | =Argument=   | =Input=                                                 |
+        | verify_every | Check every this many clicks against the live element   |
+
+        | =Return=     | =Output=                                                |
+        | None         | None                                                    |
+        """
+        self._geometry.verify_every = int(verify_every)
+        self._geometry.enabled = True
+
+    def disable_geometry_cache(self):
+        """Forgets all remembered positions and finds elements before every click again."""
+        self._geometry.enabled = False
+        self._geometry.forget()
+
+    def enable_read_cache(self):
+        """Caches results of attribute, value and enabled-state queries until the next action.
+
+        Any keyword that changes the application or session state, such as clicks, key presses,
+        entering values or window operations, clears the cache. Wait keywords always query the
+        live state.
+        """
+        self._read_cache.enabled = True
+
+    def disable_read_cache(self):
+        """Stops caching query results and clears the cache."""
+        self._read_cache.enabled = False
+        self._read_cache.clear()
+
+    def get_read_cache_statistics(self):
+        """Returns hit and miss counts of the read cache.
+
+        | =Return=   | =Output=                                      |
+        | statistics | Dictionary with keys hits, misses and entries |
+        """
+        return self._read_cache.statistics()
+
+    def get_endpoint_statistics(self, check_health=False):
+        """Returns load, latency and health of every driver endpoint given to the library.
+
+        Arguments detailed:
+        | =Argument=   | =Input=                                                  |
+        | check_health | Whether to query the status of every endpoint beforehand |
+
+        | =Return=     | =Output=                                                 |
+        | endpoints    | List of dictionaries, one for each endpoint              |
+        """
+        if self._scheduler is None:
+            return [{'url': self.path, 'sessions': len(self.__sessions)}]
+        if check_health:
+            return self._scheduler.check_health()
+        return self._scheduler.statistics()
+
+    def get_proxy_metrics(self):
+        """Returns queue depth and wait time metrics of the WADLibrary proxy the library is connected to.
+
+        Only available when the library path points to a proxy started with python -m WADLibrary.proxy.
+
+        | =Return=   | =Output=                          |
+        | metrics    | Dictionary of proxy metrics       |
+        """
+        res = execute.send('GET', self.path + '/wad-proxy/metrics', idempotent=True)
+        if res.status_code != 200:
+            raise Error('%s is not a WADLibrary proxy' % self.path)
+        return json.loads(res.text)
+
+    def get_wadlibrary_statistics(self):
+        """Returns counters of retries, circuit breaker events and other transport activity.
+
+        The counters are also written to the log.
+
+        | =Return=   | =Output=                          |
+        | statistics | Dictionary of counter name: value |
+        """
+        counters = stats.as_dict()
+        logger.info('\n'.join('%s: %s' % (name, counters[name]) for name in sorted(counters)))
+        return counters
+
+    def reset_wadlibrary_statistics(self):
+        """Resets all counters returned by Get WADLibrary Statistics."""
+        stats.reset()
+
     ####################################################################################################################
     # Waiting functions
     ####################################################################################################################
@@ -646,9 +1364,10 @@ class Keywords:
         """
         if timeout is None:
             timeout = self.timeout
+        loc = locators.resolve(locator, using)
 
         def check_visibility():
-            visible = self._is_visible(locator, using, session_id)
+            visible = self._is_visible(loc, session_id=session_id)
             if visible:
                 return
             elif visible is None:
@@ -675,9 +1394,10 @@ class Keywords:
         """
         if timeout is None:
             timeout = self.timeout
+        loc = locators.resolve(locator, using)
 
         def check_visibility():
-            visible = self._is_visible(locator, using, session_id)
+            visible = self._is_visible(loc, session_id=session_id)
             if visible:
                 return error or "Element '%s' is still visible in %s" % (locator, timeout)
             elif visible is None:
@@ -707,9 +1427,10 @@ class Keywords:
         """
         if timeout is None:
             timeout = self.timeout
+        chain = locators.parse_chain(args)
 
         def check_visibility():
-            visible = self._is_child_element_visible(*args, session_id=session_id)
+            visible = self._is_child_element_visible(*chain, session_id=session_id)
             locator = args[-1]
             if visible:
                 return
@@ -740,9 +1461,10 @@ class Keywords:
         """
         if timeout is None:
             timeout = self.timeout
+        chain = locators.parse_chain(args)
 
         def check_visibility():
-            visible = self._is_child_element_visible(*args, session_id=session_id)
+            visible = self._is_child_element_visible(*chain, session_id=session_id)
             locator = args[-1]
             if visible:
                 return error or "Element '%s' is still visible in %s" % (locator, timeout)
@@ -770,9 +1492,10 @@ class Keywords:
         """
         if timeout is None:
             timeout = self.timeout
+        loc = locators.resolve(locator, using)
 
         def check_enabled():
-            enabled = self.is_element_enabled(value=locator, using=using, session_id=session_id)
+            enabled = self.is_element_enabled(value=loc, session_id=session_id)
             if enabled:
                 return
             elif enabled is None:
@@ -799,9 +1522,10 @@ class Keywords:
         """
         if timeout is None:
             timeout = self.timeout
+        loc = locators.resolve(locator, using)
 
         def check_enabled():
-            enabled = self.is_element_enabled(value=locator, using=using, session_id=session_id)
+            enabled = self.is_element_enabled(value=loc, session_id=session_id)
             if enabled:
                 return error or "Element '%s' was not enabled in %s" % (locator, timeout)
             elif enabled is None:
@@ -829,9 +1553,10 @@ class Keywords:
         """
         if timeout is None:
             timeout = self.timeout
+        loc = locators.resolve(locator, using)
 
         def check_value():
-            element_value = self.get_element_value(locator, using, session_id)
+            element_value = self.get_element_value(loc, session_id=session_id)
             if element_value == value:
                 return
             elif element_value is None:
@@ -842,24 +1567,721 @@ class Keywords:
 
         self._wait_until_no_error(timeout, check_value)
 
-    def _create_session(self, desired_caps, name):
+    def verify_element_values(self, expected, using='name', attribute='Value.Value', timeout=None, session_id=None):
+        """Verifies that many elements have the expected values, reporting all mismatches at once.
+
+        All elements are found and read in parallel. Elements with a wrong value, or that were not found,
+        are read again until they match or the timeout elapses; elements that already matched are not
+        read again. Compiled locators can be used as keys regardless of using. With using set to None,
+        every key is interpreted as locator_type:locator, which allows mixing locator types.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                                  |
+        | expected   | Dictionary of element locator: expected value            |
+        | using      | Type of element locators, or None                        |
+        | attribute  | Attribute compared to the expected values                |
+        | timeout    | How long to wait until all elements have expected values |
+        | session_id | Session where elements are searched from                 |
+
+        | =Return=   | =Output=                                                 |
+        | error      | Listing all mismatching elements, if any remain          |
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if session_id is None:
+            session_id = self.get_current_session_id()
+        pending = {}
+        for locator, value in expected.items():
+            if isinstance(locator, locators.Locator) or using is None:
+                loc = locators.parse(locator)
+            else:
+                loc = locators.resolve(locator, using)
+            pending[loc] = str(value)
+        mismatches = {}
+
+        def read(loc):
+            try:
+                return self._get_attribute_for_elem(self.find_element(loc, session_id=session_id), attribute,
+                                                    session_id)
+            except (DeadlineExceeded, DeferredCommandError):
+                raise
+            except Error:
+                return MISSING
+
+        def check_values():
+            checked = list(pending)
+            for loc, actual in zip(checked, run_concurrently(read, checked)):
+                if actual is not MISSING and str(actual) == pending[loc]:
+                    del pending[loc]
+                    mismatches.pop(loc, None)
+                else:
+                    mismatches[loc] = actual
+            if not pending:
+                return
+            lines = []
+            for loc, actual in mismatches.items():
+                if actual is MISSING:
+                    lines.append("Element locator '%s' did not match any elements" % loc)
+                else:
+                    lines.append("Element '%s' has value '%s', expected '%s'" % (loc, actual, pending[loc]))
+            return "%d of %d elements did not have the expected value in %s:\n%s" % (
+                len(pending), len(expected), timeout, '\n'.join(lines))
+
+        self._wait_until_no_error(timeout, check_values)
+
+    def wait_until_ui_is_stable(self, *args, quiet_period=0.5, attributes='BoundingRectangle,Name,IsEnabled',
+                                timeout=None, error=None, session_id=None):
+        """Waits until the UI has not changed for the quiet period.
+
+        Without locators the whole window of the session is watched through a hash of its page source.
+        With locators, given in the same format as for the chain keywords, only the attributes of the
+        last element in the chain are watched, which is much cheaper. Use this instead of fixed sleeps
+        after actions that make the application repaint.
+
+        Arguments detailed:
+        | =Argument=   | =Input=                                                          |
+        | *args        | Optional chain of locators, interpreted as locator_type:locator  |
+        | quiet_period | Seconds the UI must stay unchanged                               |
+        | attributes   | Comma separated attributes watched when locators are given       |
+        | timeout      | How long to wait until the UI is stable                          |
+        | error        | Error to show in case the UI does not become stable              |
+        | session_id   | Session whose window is watched                                  |
+
+        | =Return=     | =Output=                                                         |
+        | error        | If the UI did not stay unchanged for the quiet period in timeout |
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if session_id is None:
+            session_id = self.get_current_session_id()
+        quiet_period = float(quiet_period)
+        chain = locators.parse_chain(args)
+        attributes = self._split_attributes(attributes)
+        state = {'fingerprint': None, 'since': None}
+
+        def fingerprint():
+            if not chain:
+                res = execute.get(self._session_url(session_id) + '/source')
+                return hashlib.sha1(res.content).hexdigest()
+            elem = self.find_child_element(*chain, session_id=session_id)
+            values = [str(self._get_attribute_for_elem(elem, attribute, session_id)) for attribute in attributes]
+            return hashlib.sha1('\0'.join(values).encode('utf-8')).hexdigest()
+
+        def check_stable():
+            try:
+                current = fingerprint()
+            except (DeadlineExceeded, DeferredCommandError):
+                raise
+            except Error as e:
+                # A missing element is not stable, polling goes on and fails with this error at the timeout
+                state['since'] = None
+                return error or "UI did not become stable in %s: %s" % (timeout, e)
+            now = time.time()
+            if state['since'] is None or current != state['fingerprint']:
+                state['fingerprint'] = current
+                state['since'] = now
+            elif now - state['since'] >= quiet_period:
+                return
+            return error or "UI did not stay unchanged for %s seconds in %s" % (quiet_period, timeout)
+
+        self._wait_until_no_error(timeout, check_stable)
+
+    def get_ui_snapshot(self, ignore=None, session_id=None):
+        """Takes a snapshot of the page source of the session's window.
+
+        The snapshot is also kept as the baseline of the next Get UI Changes call for the session.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                                      |
+        | ignore     | Comma separated attributes left out of comparisons           |
+        | session_id | Session whose window is snapshotted                          |
+
+        | =Return=   | =Output=                                                     |
+        | source     | Page source XML of the window                                |
+        """
+        if session_id is None:
+            session_id = self.get_current_session_id()
+        source = self._get_source(session_id)
+        self._ui_snapshots[session_id] = uitree.parse(source, self._split_attributes(ignore))
+        return source
+
+    def get_ui_changes(self, before=None, after=None, ignore=None, session_id=None):
+        """Returns the elements added, removed and changed between two page source snapshots.
+
+        Elements are matched by RuntimeId, or by AutomationId when they have none, and unchanged
+        branches of the tree are skipped using hashes of their subtrees. Without before, the snapshot
+        of the previous Get UI Snapshot or Get UI Changes call of the session is used, and without
+        after the live window is read and becomes the baseline of the next call.
+
+        Each element is a dictionary with tag, name, automation_id, runtime_id, path and descendants.
+        Changed elements also have changes, mapping each changed attribute to its old and new value.
+
+        Example:
+        | Get UI Snapshot  |
+        | Click Element    | Open |
+        | ${changes}=      | Get UI Changes |
+        | Should Not Be Empty | ${changes}[added] |
+
+        Arguments detailed:
+        | =Argument= | =Input=                                                      |
+        | before     | Earlier page source, by default the session's last snapshot  |
+        | after      | Later page source, by default the live window                |
+        | ignore     | Comma separated attributes left out of comparisons           |
+        | session_id | Session whose window is compared                             |
+
+        | =Return=   | =Output=                                                     |
+        | changes    | Dictionary with lists added, removed and changed             |
+        """
+        if session_id is None:
+            session_id = self.get_current_session_id()
+        ignore = self._split_attributes(ignore)
+        if before is not None:
+            old = uitree.parse(before, ignore)
+        elif session_id in self._ui_snapshots:
+            old = self._ui_snapshots[session_id]
+        else:
+            raise Error('No earlier snapshot of session %s, use Get UI Snapshot first' % session_id)
+        if after is not None:
+            new = uitree.parse(after, ignore)
+        else:
+            new = uitree.parse(self._get_source(session_id), ignore)
+            self._ui_snapshots[session_id] = new
+        changes = uitree.diff(old, new)
+        logger.info('UI changes: %d added, %d removed, %d changed' % (
+            len(changes['added']), len(changes['removed']), len(changes['changed'])))
+        return changes
+
+    def _find_in(self, parent, loc, session_id):
+        """Returns the first element under parent matching the locator, or None if there is none."""
+        res = execute.post(self._session_url(session_id) + '/element/' + parent + '/element',
+                           json=loc.as_json(session_id), catch_error=False, idempotent=True)
+        json_obj = json.loads(res.text)
+        if json_obj['status'] != 0:
+            return None
+        return json_obj['value']['ELEMENT']
+
+    def _scroll_geometry(self, list_elem, session_id):
+        """Returns the current page and page count of a list from its scroll pattern, or None."""
+        collection = ElementCollection([{'ELEMENT': list_elem}], self._session_url(session_id))
+        names = ('Scroll.VerticallyScrollable', 'Scroll.VerticalScrollPercent', 'Scroll.VerticalViewSize')
+        try:
+            scrollable, percent, view = [collection.attribute(list_elem, name) for name in names]
+            percent, view = float(percent), float(view)
+        except (DeadlineExceeded, DeferredCommandError):
+            raise
+        except (Error, TypeError, ValueError):
+            return None
+        if str(scrollable).lower() != 'true' or not 0 < view <= 100:
+            return None
+        pages = int(math.ceil(100.0 / view))
+        return int(round(max(0.0, percent) / 100.0 * (pages - 1))), pages
+
+    def _scroll_to_page(self, search, page):
+        """Scrolls a list to a page with one request of PAGE_DOWN, PAGE_UP or HOME keys."""
+        state = search['state']
+        if page == state['page']:
+            return
+        if page == 0 or search['absolute']:
+            # Without a known position, pages are counted from the top so overshooting the end does not drift
+            value = [keys('HOME')] + [keys('PAGE_DOWN')] * page
+        elif page > state['page']:
+            value = [keys('PAGE_DOWN')] * (page - state['page'])
+        else:
+            value = [keys('PAGE_UP')] * (state['page'] - page)
+        self._read_cache.clear()
+        execute.post(self._session_url(search['session_id']) + '/element/' + search['list'] + '/value',
+                     json={'value': value})
+        state['page'] = page
+        search['probes'] += 1
+
+    def _visible_rows(self, search):
+        res = execute.post(self._session_url(search['session_id']) + '/element/' + search['list'] + '/elements',
+                           json=search['rows'].as_json(search['session_id']), catch_error=False, idempotent=True)
+        json_obj = json.loads(res.text)
+        if json_obj['status'] != 0:
+            return ElementCollection([], self._session_url(search['session_id']))
+        return ElementCollection(json_obj['value'], self._session_url(search['session_id']))
+
+    def _scan_pages(self, search):
+        """Visits the pages of a list one by one, starting after the current one, until the item is found."""
+        state = search['state']
+        start = state['page']
+        if search['pages'] is not None:
+            order = list(range(start + 1, search['pages'])) + list(range(0, start))
+        else:
+            order = None
+        while search['probes'] < search['max_pages']:
+            if order is not None:
+                if not order:
+                    return None
+                page = order.pop(0)
+            else:
+                # Without a page count the end shows as a page whose rows did not change
+                before = self._visible_rows(search).ids()[:1]
+                page = state['page'] + 1
+            search['absolute'] = False
+            self._scroll_to_page(search, page)
+            elem = self._find_in(search['list'], search['item'], search['session_id'])
+            if elem is not None:
+                return elem
+            if order is None and self._visible_rows(search).ids()[:1] == before:
+                state['page'] -= 1
+                if start == 0:
+                    return None
+                order = list(range(0, start))
+        return None
+
+    def _bisect_pages(self, search, attribute, target):
+        """Finds the page of a sorted list holding the target value by galloping and bisection."""
+        state = search['state']
+        bounds = {'first': None}
+
+        def probe(page):
+            self._scroll_to_page(search, page)
+            visible = self._visible_rows(search)
+            if not visible:
+                return None, False
+            first, last = visible.ids()[0], visible.ids()[-1]
+            visible.fetch(attribute, elems=[first, last])
+            moved = first != bounds['first']
+            bounds['first'] = first
+            return _compare_to_range(target, visible.attribute(first, attribute),
+                                     visible.attribute(last, attribute)), moved
+
+        low, high = 0, None if search['pages'] is None else search['pages'] - 1
+        page = state['page']
+        if high is None:
+            # Gallop downwards from the current page until the target is no longer after the view
+            step = 1
+            while search['probes'] < search['max_pages']:
+                order, moved = probe(page)
+                if order is None:
+                    return None
+                if order == 0:
+                    return self._find_in(search['list'], search['item'], search['session_id'])
+                if order < 0:
+                    high = page - 1
+                    break
+                if not moved and page > low:
+                    return None
+                low = page + 1
+                page += step
+                step *= 2
+        while high is not None and low <= high and search['probes'] < search['max_pages']:
+            page = (low + high) // 2
+            order, _ = probe(page)
+            if order is None:
+                return None
+            if order == 0:
+                return self._find_in(search['list'], search['item'], search['session_id'])
+            if order < 0:
+                high = page - 1
+            else:
+                low = page + 1
+        return None
+
+    def _find_by_xpath(self, loc, session_id):
+        """Finds an element with the planned lookups of an XPath locator, falling back to the XPath itself."""
+        steps = None if self._planner.prefer_xpath(loc.value) else self._planner.plan(loc.value)
+        if steps is not None:
+            start = time.time()
+            elem = self._run_plan(steps, session_id)
+            if elem is not None:
+                self._planner.record_query(loc.value, 'planned', time.time() - start)
+                stats.increment('xpath_rewritten')
+                return elem
+        start = time.time()
+        res = execute.post(self._session_url(session_id) + '/element', json=loc.as_json(session_id),
+                           idempotent=True)
+        self._planner.record_query(loc.value, 'xpath', time.time() - start)
+        if steps is not None:
+            # Only now is it known that the lookups missed an existing element, rather than the
+            # element not existing yet as is usual while waiting for it
+            self._planner.record_miss(loc.value)
+        return json.loads(res.text)['value']['ELEMENT']
+
+    def _run_plan(self, steps, session_id):
+        """Returns the element the planned lookups find, or None if a lookup or check fails."""
+        parent = None
+        for step in steps:
+            loc = self._planner.choose(step)
+            url = self._session_url(session_id) + '/element'
+            if parent is not None:
+                url += '/' + parent + '/element'
+            start = time.time()
+            res = execute.post(url, json=loc.as_json(session_id), catch_error=False, idempotent=True)
+            self._planner.record_strategy(loc.using, time.time() - start)
+            json_obj = json.loads(res.text)
+            if json_obj['status'] != 0:
+                return None
+            parent = json_obj['value']['ELEMENT']
+            for attribute, expected in step.checks.items():
+                if attribute is None:
+                    if loc.using == 'tag name':
+                        continue
+                    res = execute.get(self._session_url(session_id) + '/element/' + parent + '/name')
+                    actual = json.loads(res.text)['value'].rsplit('.', 1)[-1]
+                elif ATTRIBUTE_STRATEGIES.get(attribute) == loc.using:
+                    continue
+                else:
+                    actual = self._get_attribute_for_elem(parent, attribute, session_id)
+                if str(actual) != expected:
+                    return None
+        return parent
+
+    def _get_source(self, session_id):
+        res = execute.get(self._session_url(session_id) + '/source')
+        return json.loads(res.text)['value']
+
+    @staticmethod
+    def _split_attributes(attributes):
+        if not attributes:
+            return ()
+        if isinstance(attributes, str):
+            return [attribute.strip() for attribute in attributes.split(',') if attribute.strip()]
+        return list(attributes)
+
+    def _create_session(self, desired_caps, name, endpoint=None):
         """Creates a session with desired capabilities.
 
         Arguments detailed:
-        | =Argument=   | =Input=                          |
-        | desired_caps | Dict of capabilities for session |
-        | name         | Name for session                 |
+        | =Argument=   | =Input=                                   |
+        | desired_caps | Dict of capabilities for session          |
+        | name         | Name for session                          |
+        | endpoint     | Driver endpoint, by default the suite's   |
 
-        | =Return=     | =Output=                         |
-        | session_obj  | Created session                  |
+        | =Return=     | =Output=                                  |
+        | session_obj  | Created session                           |
         """
-        res = execute.post(self.path + '/session/', json={'desiredCapabilities': desired_caps})
+        if endpoint is None:
+            endpoint = self.path
+        self._read_cache.clear()
+        res = execute.post(endpoint + '/session/', json={'desiredCapabilities': desired_caps})
         json_obj = json.loads(res.text)
         session_id = json_obj['sessionId']
+        if self._scheduler is not None:
+            self._scheduler.bind(session_id, endpoint)
         session_obj = Sessions(session_id=session_id, name=name, desired_caps=desired_caps)
-        self.__sessions.append(session_obj)
+        self.__sessions.add(session_obj)
+        stats.set_max('sessions_high_water', self.__sessions.high_water)
+        self._collect_sessions(keep=session_obj)
         return session_obj
 
+    def _get_repository(self):
+        if self._repository is None:
+            raise Error('No locator repository loaded, use Load Locator Repository first')
+        return self._repository
+
+    def _resolve_screen_locator(self, locator, session_id):
+        return self._repository.resolve(locator, session_id,
+                                        lambda chain: self.find_child_element(*chain, session_id=session_id))
+
+    def _session_state(self):
+        """Returns the endpoint and sessions of the library as saved in a state file."""
+        return {'endpoint': self.path,
+                'sessions': [{'id': session.get_id(), 'name': session.get_name(),
+                              'caps': session.get_desired_caps()} for session in self.__sessions.all()]}
+
+    def _adopt_session_state(self, state):
+        """Takes over the sessions of a saved state if its Root session is still alive.
+
+        Sessions of the state that no longer exist on the driver, or whose window has closed, are
+        dropped, the others keep their names. As after Set Up, Root is the current session. Returns
+        whether the state was adopted.
+        """
+        endpoint = state.get('endpoint')
+        if self._scheduler is not None:
+            if endpoint not in [candidate.url for candidate in self._scheduler.endpoints]:
+                return False
+        elif endpoint != self.path:
+            return False
+        try:
+            res = execute.get(endpoint + '/sessions', catch_error=False)
+            live = {session['id'] for session in json.loads(res.text)['value']}
+        except (Error, ValueError, KeyError, TypeError):
+            return False
+        saved = [entry for entry in state.get('sessions', []) if entry.get('id') in live]
+        if not any(entry['name'] == 'Root' for entry in saved):
+            return False
+        self.path = endpoint
+        self._read_cache.clear()
+        for entry in saved:
+            self.__sessions.add(Sessions(session_id=entry['id'], name=entry['name'], desired_caps=entry['caps']))
+            if self._scheduler is not None:
+                self._scheduler.bind(entry['id'], endpoint)
+        stats.set_max('sessions_high_water', self.__sessions.high_water)
+        windows = [session for session in self.__sessions.all() if session.get_name() != 'Root']
+        for session, alive in zip(windows, run_concurrently(self._is_session_alive, windows)):
+            if alive is False:
+                self._drop_session(session)
+        root = self.get_session('Root')
+        self._root_id = root.get_id()
+        self.__default_session = root
+        self._set_current(root)
+        self.set_wadlibrary_checkpoint()
+        return True
+
+    def _get_current(self):
+        """Returns the current session of the calling thread."""
+        session = getattr(self.__context, 'session', None)
+        return session if session is not None else self.__default_session
+
+    def _set_current(self, session):
+        """Sets the current session of the calling thread.
+
+        In the main thread this also sets the session used by threads that have not set their own.
+        """
+        self.__context.session = session
+        if threading.current_thread() is threading.main_thread():
+            self.__default_session = session
+
+    def _endpoint(self, session_id):
+        """Returns the driver endpoint that the session lives on."""
+        if self._scheduler is None:
+            return self.path
+        return self._scheduler.endpoint_for(session_id, self.path)
+
+    def _session_url(self, session_id, touch=True):
+        """Returns the base url for requests to the session.
+
+        The session is marked as used now unless touch is False, which housekeeping requests such as
+        liveness checks and deletions use so that they do not disturb the least recently used order.
+        """
+        if touch:
+            self.__sessions.touch(session_id)
+        return self._endpoint(session_id) + '/session/' + session_id
+
+    def _is_session_alive(self, session):
+        """Checks whether the window of a session still exists with one window handle request."""
+        res = execute.get(self._session_url(session.get_id(), touch=False) + '/window_handle',
+                          catch_error=False)
+        status = json.loads(res.text)['status']
+        if status == 0:
+            return True
+        if status in DEAD_SESSION_STATUSES:
+            return False
+        execute.analyse(res, catch_error=True)
+
+    def _drop_session(self, session):
+        """Deletes a session on the driver, ignoring errors, and forgets it."""
+        try:
+            self.delete_session(session.get_id())
+        except (DeadlineExceeded, DeferredCommandError):
+            raise
+        except Error:
+            pass
+        self.__sessions.remove(session)
+        if self._get_current() is session:
+            self._set_current(self._root_session())
+
+    def _reset_sessions(self):
+        """Closes the windows and deletes the sessions created since the checkpoint, then clears all caches.
+
+        Root becomes the current session of every thread that uses the default one.
+        """
+        for session in self.__sessions.all():
+            if session.get_id() in self._checkpoint or session.get_name() == 'Root':
+                continue
+            try:
+                execute.delete(self._session_url(session.get_id(), touch=False) + '/window', catch_error=False)
+            except (DeadlineExceeded, DeferredCommandError):
+                raise
+            except Error:
+                pass
+            self._drop_session(session)
+        root = self._root_session()
+        self.__default_session = root
+        self._set_current(root)
+        self._clear_caches()
+
+    def _root_session(self):
+        """Returns the Root session this library set up, or the first Root session if it is not known."""
+        session = self.__sessions.by_id(self._root_id) if self._root_id else None
+        return session if session is not None else self.get_session('Root')
+
+    def _forget_sessions(self):
+        """Forgets all sessions without contacting the driver."""
+        self._root_id = None
+        for session in self.__sessions.all():
+            self.__sessions.remove(session)
+        self.__default_session = None
+        self.__context.session = None
+        self._clear_caches()
+
+    def _clear_caches(self):
+        self._read_cache.clear()
+        if self._repository is not None:
+            self._repository.forget()
+        self._ui_snapshots.clear()
+        self._scroll_positions.clear()
+        self._geometry.forget()
+
+    def _collect_sessions(self, keep=None):
+        """Prunes dead sessions when due, then evicts least recently used ones above the session limit."""
+        interval = self._session_gc['interval']
+        max_sessions = self._session_gc['max_sessions']
+        pruned = False
+        if interval is not None and time.time() - self._session_gc['last'] >= interval:
+            self.prune_sessions()
+            pruned = True
+        if max_sessions is None or len(self.__sessions) <= max_sessions:
+            return
+        if not pruned:
+            self.prune_sessions()
+        current = self._get_current()
+        evictable = sorted((session for session in self.__sessions.all()
+                            if session.get_name() != 'Root' and session is not keep and session is not current),
+                           key=lambda session: session.last_used)
+        for session in evictable[:max(0, len(self.__sessions) - max_sessions)]:
+            self._drop_session(session)
+            stats.increment('sessions_evicted')
+
+    def _click_elem(self, elem, button='left', count=1, session_id=None):
+        """Clicks an element with as few requests as the driver allows.
+
+        A single left click is sent as one element click request, and other clicks as one W3C actions
+        request. If the driver does not support either, the mouse is moved to the element and clicked
+        with separate requests.
+
+        Arguments detailed:
+        | =Argument=   | =Input=                                                    |
+        | elem         | Element identifier                                         |
+        | button       | Mouse button which will be clicked (left, right or middle) |
+        | count        | Number of clicks, 1 or 2                                   |
+        | session_id   | Session where element is located                           |
+
+        | =Return=     | =Output=                                                   |
+        | None         | None                                                       |
+        """
+        if session_id is None:
+            session_id = self.get_current_session_id()
+        self._read_cache.clear()
+        if button == 'left' and count == 1 and self._click_support['element'] is not False:
+            if self._try_fast_click('element', self._session_url(session_id) + '/element/' + elem + '/click', {}):
+                return
+        if self._click_support['actions'] is not False:
+            pointer_actions = [{'type': 'pointerMove', 'duration': 0, 'x': 0, 'y': 0,
+                                'origin': {W3C_ELEMENT: elem, 'ELEMENT': elem}}]
+            for _ in range(count):
+                pointer_actions.append({'type': 'pointerDown', 'button': MOUSE_BUTTONS[button]})
+                pointer_actions.append({'type': 'pointerUp', 'button': MOUSE_BUTTONS[button]})
+            payload = {'actions': [{'type': 'pointer', 'id': 'mouse', 'parameters': {'pointerType': 'mouse'},
+                                    'actions': pointer_actions}]}
+            if self._try_fast_click('actions', self._session_url(session_id) + '/actions', payload):
+                return
+        self._move_to_element(elem, session_id)
+        if count == 2:
+            self.double_click(session_id)
+        else:
+            self._mouse_click(button, session_id)
+
+    def _window_rect(self, session_id, cached=True):
+        """Returns (x, y, width, height) of the session's window, or None if the driver cannot tell.
+
+        The rectangle is remembered until a window keyword or a failed check invalidates it, unless
+        cached is False, in which case the live rectangle is read and remembered.
+        """
+        window = self._geometry.window(session_id) if cached else None
+        if window is None:
+            window = self._read_window_rect(session_id)
+            if window is not None:
+                self._geometry.put_window(session_id, window)
+        return window
+
+    def _read_window_rect(self, session_id):
+        url = self._session_url(session_id)
+        if self._click_support.get('window_rect') is not False:
+            res = execute.get(url + '/window/rect', catch_error=False)
+            try:
+                json_obj = json.loads(res.text)
+                status = json_obj['status']
+            except (ValueError, KeyError, TypeError):
+                json_obj, status = None, None
+            if status == 0:
+                self._click_support['window_rect'] = True
+                rect = json_obj['value']
+                return rect['x'], rect['y'], rect['width'], rect['height']
+            if status in UNSUPPORTED_STATUSES or (status is None and res.status_code in (404, 405, 501)):
+                self._click_support['window_rect'] = False
+        try:
+            position = json.loads(execute.get(url + '/window/current/position').text)['value']
+            size = json.loads(execute.get(url + '/window/current/size').text)['value']
+        except (DeadlineExceeded, DeferredCommandError):
+            raise
+        except (Error, KeyError, TypeError):
+            return None
+        return position['x'], position['y'], size['width'], size['height']
+
+    def _remember_geometry(self, loc, elem, session_id):
+        """Stores the rectangles of an element and its window for later clicks by coordinates."""
+        if self._click_support['actions'] is False:
+            return
+        window = self._window_rect(session_id, cached=False)
+        if window is None:
+            return
+        try:
+            rect = parse_rect(self._get_attribute_for_elem(elem, 'BoundingRectangle', session_id))
+        except (DeadlineExceeded, DeferredCommandError):
+            raise
+        except Error:
+            return
+        self._geometry.put(session_id, loc, rect, window)
+
+    def _click_cached_geometry(self, loc, button, session_id):
+        """Clicks the remembered position of an element with one actions request.
+
+        Returns False without clicking if the position is unknown or no longer valid, because the
+        window has moved or been resized or a sampled check against the live element failed.
+        """
+        geometry = self._geometry.get(session_id, loc)
+        if geometry is None or self._click_support['actions'] is False:
+            return False
+        verify = self._geometry.should_verify(geometry)
+        # The window is read live on sampled checks only, window keywords invalidate it otherwise
+        if self._window_rect(session_id, cached=not verify) != geometry.window:
+            self._geometry.forget(session_id)
+            stats.increment('geometry_invalidations')
+            return False
+        if verify:
+            try:
+                elem = self.find_element(value=loc, session_id=session_id)
+                rect = parse_rect(self._get_attribute_for_elem(elem, 'BoundingRectangle', session_id))
+            except (DeadlineExceeded, DeferredCommandError):
+                raise
+            except Error:
+                rect = None
+            if rect != geometry.rect:
+                self._geometry.forget(session_id, loc)
+                stats.increment('geometry_invalidations')
+                return False
+        x, y = geometry.center()
+        pointer_actions = [{'type': 'pointerMove', 'duration': 0, 'x': x, 'y': y, 'origin': 'viewport'},
+                           {'type': 'pointerDown', 'button': MOUSE_BUTTONS[button]},
+                           {'type': 'pointerUp', 'button': MOUSE_BUTTONS[button]}]
+        payload = {'actions': [{'type': 'pointer', 'id': 'mouse', 'parameters': {'pointerType': 'mouse'},
+                                'actions': pointer_actions}]}
+        self._read_cache.clear()
+        if not self._try_fast_click('actions', self._session_url(session_id) + '/actions', payload):
+            return False
+        stats.increment('geometry_clicks')
+        return True
+
+    def _try_fast_click(self, kind, url, payload):
+        """Sends a single-request click and returns False if the driver does not support it."""
+        res = execute.post(url, json=payload, catch_error=False)
+        try:
+            status = json.loads(res.text)['status']
+        except (ValueError, KeyError, TypeError):
+            status = None
+        if status == 0:
+            self._click_support[kind] = True
+            stats.increment('requests_saved')
+            return True
+        if status in UNSUPPORTED_STATUSES or (status is None and res.status_code in (404, 405, 501)):
+            self._click_support[kind] = False
+            return False
+        execute.analyse(res, catch_error=True)
+
     def _move_to_element(self, elem, session_id=None):
         """Moves mouse to specified element.
 
@@ -874,7 +2296,8 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        execute.post(self.path + '/session/' + session_id + '/moveto', json={'element': elem})
+        self._read_cache.clear()
+        execute.post(self._session_url(session_id) + '/moveto', json={'element': elem})
 
     def _mouse_click(self, button='left', session_id=None):
         """Clicks the mouse button.
@@ -889,8 +2312,8 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        buttons = {'left': 0, 'middle': 1, 'right': 2}
-        execute.post(self.path + '/session/' + session_id + '/click', json={'button': buttons[button]})
+        self._read_cache.clear()
+        execute.post(self._session_url(session_id) + '/click', json={'button': MOUSE_BUTTONS[button]})
 
     def _get_attribute_for_elem(self, elem, attribute='Name', session_id=None):
         """Retrieves the value of a specified attribute for element given as parameter.
@@ -906,7 +2329,7 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        res = execute.get(self.path + '/session/' + session_id + '/element/' + elem +
+        res = execute.get(self._session_url(session_id) + '/element/' + elem +
                           '/attribute/' + attribute)
         json_obj = json.loads(res.text)
         attribute = json_obj['value']
@@ -927,9 +2350,9 @@ class Keywords:
         """
         if session_id is None:
             session_id = self.get_current_session_id()
-        res = execute.post(self.path + '/session/' + session_id + '/element',
-                           json={'using': using, 'sessionId': session_id, 'value': value},
-                           catch_error=False)
+        loc = locators.resolve(value, using)
+        res = execute.post(self._session_url(session_id) + '/element',
+                           json=loc.as_json(session_id), catch_error=False, idempotent=True)
         json_obj = json.loads(res.text)
         if json_obj['status'] == 0:
             return True
@@ -957,17 +2380,14 @@ class Keywords:
         if session_id is None:
             session_id = self.get_current_session_id()
         parent_elem = None
-        for i in range(len(args)):
-            using, value = args[i].split(":", 1)
+        for i, loc in enumerate(locators.parse_chain(args)):
             if i == 0:
-                res = execute.post(self.path + '/session/' + session_id + '/element',
-                                   json={'using': using, 'sessionId': session_id, 'value': value},
-                                   catch_error=False)
+                res = execute.post(self._session_url(session_id) + '/element',
+                                   json=loc.as_json(session_id), catch_error=False, idempotent=True)
             else:
-                res = execute.post(self.path + '/session/' + session_id + '/element/' +
+                res = execute.post(self._session_url(session_id) + '/element/' +
                                    parent_elem + '/element/',
-                                   json={'using': using, 'sessionId': session_id, 'value': value},
-                                   catch_error=False)
+                                   json=loc.as_json(session_id), catch_error=False, idempotent=True)
             json_obj = json.loads(res.text)
             if json_obj['status'] == 7:
                 return False
@@ -1005,7 +2425,9 @@ class Keywords:
     def _wait_until_no_error(self, timeout, wait_func, *args):
         """General purpose wait function, acts as a helper for other wait functions.
 
-        Waits until the function given as parameter returns true or timeout has elapsed.
+        Waits until the function given as parameter returns true or timeout has elapsed. The read cache
+        is bypassed while waiting and cleared afterwards, since the application state has changed
+        while waiting.
 
         Arguments detailed:
         | =Argument= | =Input=                                 |
@@ -1016,12 +2438,25 @@ class Keywords:
         | =Return=   | =Output=                                |
         | None       | None                                    |
         """
-        timeout = self.timeout if timeout is None else timeout
+        timeout = float(self.timeout if timeout is None else timeout)
         max_time = time.time() + timeout
-        while True:
-            timeout_error = wait_func(*args)
-            if not timeout_error:
-                return
-            if time.time() > max_time:
-                raise AssertionError(timeout_error)
-            time.sleep(0.1)
+        timeout_error = None
+        iteration = 0
+        try:
+            with self._read_cache.suspended():
+                while True:
+                    iteration += 1
+                    # The first check always runs, however short the timeout, later ones are bounded by it
+                    bound = deadline(max_time) if iteration > 1 else nullcontext()
+                    try:
+                        with bound, tracer.span('_wait_until_no_error iteration', 'helper', iteration=iteration):
+                            timeout_error = wait_func(*args)
+                    except DeadlineExceeded as e:
+                        raise AssertionError(timeout_error or str(e))
+                    if not timeout_error:
+                        return
+                    if time.time() > max_time:
+                        raise AssertionError(timeout_error)
+                    time.sleep(0.1)
+        finally:
+            self._read_cache.clear()
@@ -1,8 +1,14 @@
+import threading
+import time
+from collections import OrderedDict
+
+
 class Sessions:
     def __init__(self, name, session_id, desired_caps):
         self.session_id = session_id
         self.desired_caps = desired_caps
         self.name = name
+        self.last_used = time.time()
 
     def __str__(self):
         return "###\nSession name: " + self.name + "\nSession ID: " + self.session_id
@@ -15,3 +21,52 @@ class Sessions:
 
     def get_name(self):
         return self.name
+
+
+class SessionRegistry:
+    """Thread-safe collection of sessions, kept in the order they were added.
+
+    The registry remembers the highest number of sessions it has held at once.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sessions = OrderedDict()
+        self.high_water = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def add(self, session):
+        with self._lock:
+            self._sessions[session.get_id()] = session
+            self.high_water = max(self.high_water, len(self._sessions))
+
+    def remove(self, session):
+        with self._lock:
+            self._sessions.pop(session.get_id(), None)
+
+    def all(self):
+        """Returns a snapshot of all sessions."""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def ids(self):
+        with self._lock:
+            return list(self._sessions)
+
+    def by_name(self, name):
+        with self._lock:
+            for session in self._sessions.values():
+                if name == session.get_name():
+                    return session
+
+    def by_id(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def touch(self, session_id):
+        """Marks a session as used now."""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_used = time.time()
@@ -1,5 +1,13 @@
+import psutil
+import requests
+from robot.api import logger
 from .Keywords import Keywords
 from .Driver import Driver
+from .common import execute
+from .common.errors import Error, DeferredCommandError
+from .common.state import load_state, save_state, remove_state, process_alive
+from .common.profiler import profiler, ProfileListener
+from .common.trace import tracer, KeywordListener
 
 
 class WADLibrary(Keywords, Driver):
@@ -12,21 +20,182 @@ class WADLibrary(Keywords, Driver):
     | Driver.py   | Windows Application Driver startup and teardown keywords |
     | Keywords.py | The actual keywords provided for use in Robot tests |
     | Sessions.py | Internal session management keywords |
-    
+
+    The path argument can also be a list or a comma separated string of several driver endpoints. Each
+    set up then runs on the least loaded healthy endpoint and all its sessions stay on that endpoint.
+
+    With a state_file, WADLibrary Set Up and WADLibrary Tear Down keep the driver and its sessions
+    running between Robot processes: tear down saves the driver process, the endpoint and the
+    sessions to the file, and the next set up adopts them if they are still alive instead of starting
+    a new driver and Root session. Use Discard WADLibrary State to stop them for good.
+
+    The library has suite scope: one instance, with its sessions, caches and settings, is shared by
+    the suite setup, all tests and the suite teardown of a suite. A Root session set up in the suite
+    setup is therefore used by every test of the suite, and Reset WADLibrary State in a test teardown
+    returns it to the state of the checkpoint for the next test.
     """
+    ROBOT_LIBRARY_SCOPE = 'SUITE'
+
     def __init__(self, path="http://127.0.0.1:4723", platform="Windows", device_name="my_machine", timeout=30,
-                 driver_path="C:/Program Files (x86)/Windows Application Driver/WinAppDriver"):
+                 driver_path="C:/Program Files (x86)/Windows Application Driver/WinAppDriver", state_file=None):
         Keywords.__init__(self, path, platform, device_name, timeout)
         Driver.__init__(self, driver_path)
+        self.state_file = state_file
+        self.ROBOT_LIBRARY_LISTENER = [KeywordListener(), ProfileListener()]
 
     def wadlibrary_set_up(self):
         """Starts the Windows Application Driver and creates a session for it.
+
+        With a state file, a driver and sessions saved by an earlier run are adopted when still alive.
+        A driver that is still running is kept even when its sessions cannot be adopted, and only a
+        new Root session is created.
         """
-        self.set_up_driver()
+        if self.state_file and self.adopt_wadlibrary_state():
+            return
+        if self.process is None:
+            self.set_up_driver()
         self.set_up()
+        if self.state_file:
+            self.save_wadlibrary_state()
 
     def wadlibrary_tear_down(self):
         """Removes all sessions and stops the Windows Application Driver.
+
+        With a state file, the driver and sessions are left running and saved for the next run instead.
+        A trace started with Start Trace and profiling started with Start Profiling are stopped and
+        written out.
+        """
+        if self.state_file:
+            self.save_wadlibrary_state()
+            if self.sampler is not None:
+                self.stop_resource_sampler()
+        else:
+            self.clean_up()
+            self.tear_down_driver()
+        if tracer.enabled:
+            self.stop_trace()
+        if profiler.enabled:
+            self.stop_profiling()
+
+    def reset_wadlibrary_state(self):
+        """Returns the library to its state at the last checkpoint without restarting the driver.
+
+        Windows and sessions created since the checkpoint, by default the one set by set up, are closed
+        and deleted, Root becomes the current session and all caches are cleared. The driver process
+        and the Root session stay alive, which makes this much faster than tearing down and setting up
+        between tests. Errors of pipelined commands of the previous test are logged and dropped.
+
+        If the driver or the Root session does not respond, the driver is restarted and a new Root
+        session is created instead.
+
+        | =Return=   | =Output=                                         |
+        | restarted  | True if a full restart was needed                |
+        """
+        try:
+            execute.pipeline.barrier()
+        except DeferredCommandError as e:
+            logger.warn('Dropped error of a pipelined command: %s' % e)
+        if self._is_healthy():
+            self._reset_sessions()
+            return False
+        logger.warn('Windows Application Driver or the Root session is not responding, restarting')
+        endpoint = self.path
+        self._forget_sessions()
+        if self.process is not None:
+            try:
+                self.tear_down_driver()
+            except psutil.Error:
+                pass
+            self.set_up_driver()
+        # The requests that failed while the driver was down have opened its circuit breaker
+        execute.reset_breakers(endpoint)
+        self.set_up()
+        if self.state_file:
+            self.save_wadlibrary_state()
+        return True
+
+    def save_wadlibrary_state(self, path=None):
+        """Saves the driver process, endpoint and sessions so that a later run can adopt them.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                          |
+        | path       | State file, by default the library's state_file  |
+
+        | =Return=   | =Output=                                         |
+        | None       | None                                             |
+        """
+        state = self._session_state()
+        state['driver_pid'] = None
+        state['driver_created'] = None
+        if self.process is not None:
+            try:
+                state['driver_pid'] = self.process.pid
+                state['driver_created'] = psutil.Process(self.process.pid).create_time()
+            except psutil.Error:
+                pass
+        save_state(self._state_path(path), state)
+
+    def adopt_wadlibrary_state(self, path=None):
+        """Takes over the driver and sessions saved by an earlier run if they are still alive.
+
+        Checking the state costs one request listing the sessions of the driver and one request for
+        each window session. The state is used only if the driver process is the one that was saved
+        and the Root session still exists; sessions whose windows have closed since are left out.
+        If the driver process is alive but its sessions cannot be used, the process is still taken
+        over, so that no second driver is started on its port.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                          |
+        | path       | State file, by default the library's state_file  |
+
+        | =Return=   | =Output=                                         |
+        | adopted    | True if the saved state was taken over           |
+        """
+        state = load_state(self._state_path(path))
+        if state is None:
+            return False
+        if not process_alive(state.get('driver_pid'), state.get('driver_created')):
+            logger.info('Saved Windows Application Driver process is gone, starting from scratch')
+            return False
+        if state.get('driver_pid') is not None:
+            self.process = psutil.Process(state['driver_pid'])
+        if not self._adopt_session_state(state):
+            logger.info('Saved sessions are no longer alive, keeping the driver and setting up new sessions')
+            return False
+        logger.info('Adopted Windows Application Driver at %s with %d sessions' % (
+            self.path, len(self.get_session_ids())))
+        return True
+
+    def discard_wadlibrary_state(self, path=None):
+        """Removes all sessions, stops the Windows Application Driver and deletes the state file.
+
+        Arguments detailed:
+        | =Argument= | =Input=                                          |
+        | path       | State file, by default the library's state_file  |
+
+        | =Return=   | =Output=                                         |
+        | None       | None                                             |
         """
         self.clean_up()
-        self.tear_down_driver()
+        if self.process is not None:
+            self.tear_down_driver()
+        remove_state(self._state_path(path))
+
+    def _is_healthy(self):
+        root = self._root_session()
+        if root is None:
+            return False
+        try:
+            # The status response of Windows Application Driver has no status field, so it is not analysed
+            res = execute.send('GET', self._endpoint(root.get_id()) + '/status', idempotent=True, timeout=(2.0, 5.0))
+            if res.status_code != 200:
+                return False
+            return self._is_session_alive(root) is True
+        except (Error, requests.RequestException, KeyError, ValueError):
+            return False
+
+    def _state_path(self, path):
+        path = path or self.state_file
+        if not path:
+            raise Error('No state file given, set state_file when importing the library')
+        return path
@@ -0,0 +1,29 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+_deadline = contextvars.ContextVar('wadlibrary_deadline', default=None)
+
+
+@contextmanager
+def deadline(expires_at):
+    """Limits all requests sent inside the block to finish before expires_at (a time.time() value).
+
+    Nested deadlines can only shorten the enclosing one.
+    """
+    current = _deadline.get()
+    if current is not None:
+        expires_at = min(current, expires_at)
+    token = _deadline.set(expires_at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Returns seconds left until the current deadline, or None when there is no deadline."""
+    expires_at = _deadline.get()
+    if expires_at is None:
+        return None
+    return expires_at - time.time()
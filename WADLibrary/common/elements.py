@@ -0,0 +1,88 @@
+import fnmatch
+import json
+import re
+import threading
+from . import execute
+from .pool import run_concurrently
+
+
+class ElementCollection(list):
+    """List of elements found by a find-all request, with lazily fetched and cached attributes.
+
+    Items are the element references returned by Windows Application Driver ({'ELEMENT': id}), so
+    a collection can be used wherever the raw list was. Attributes are fetched only when needed,
+    in parallel for all elements, and cached per element for the lifetime of the collection.
+
+    Attribute predicates are given as attribute=expected pairs. The expected value matches exactly,
+    as a glob pattern when it contains * or ?, or as a regular expression when prefixed with regexp:.
+    """
+    def __init__(self, elements, session_url, attributes=None):
+        list.__init__(self, elements)
+        self.session_url = session_url
+        self._attributes = {} if attributes is None else attributes
+        self._lock = threading.Lock()
+
+    def ids(self):
+        return [element['ELEMENT'] for element in self]
+
+    def attribute(self, elem, name):
+        """Returns an attribute of one element of the collection."""
+        self.fetch(name, elems=[elem])
+        return self._attributes[elem][name]
+
+    def values(self, name):
+        """Returns an attribute of every element, in collection order."""
+        self.fetch(name)
+        return [self._attributes[elem][name] for elem in self.ids()]
+
+    def fetch(self, *names, elems=None):
+        """Fetches the given attributes for all elements that do not have them cached yet."""
+        elems = self.ids() if elems is None else elems
+        with self._lock:
+            missing = [(elem, name) for elem in elems for name in names
+                       if name not in self._attributes.get(elem, {})]
+        values = run_concurrently(self._get_attribute, missing)
+        with self._lock:
+            for (elem, name), value in zip(missing, values):
+                self._attributes.setdefault(elem, {})[name] = value
+
+    def filter(self, **predicates):
+        """Returns a new collection with the elements matching all predicates."""
+        self.fetch(*predicates)
+        matchers = [(name, _matcher(expected)) for name, expected in predicates.items()]
+        matching = [element for element in self
+                    if all(match(self._attributes[element['ELEMENT']][name]) for name, match in matchers)]
+        return ElementCollection(matching, self.session_url, self._attributes)
+
+    def sort_by(self, name, reverse=False):
+        """Returns a new collection sorted by an attribute, numerically if all values are numbers."""
+        self.fetch(name)
+        keys = [self._attributes[element['ELEMENT']][name] for element in self]
+        try:
+            keys = [float(key) for key in keys]
+        except (TypeError, ValueError):
+            keys = ['' if key is None else str(key) for key in keys]
+        ordered = [element for _, element in sorted(zip(keys, self), key=lambda pair: pair[0], reverse=reverse)]
+        return ElementCollection(ordered, self.session_url, self._attributes)
+
+    def first(self, **predicates):
+        """Returns the identifier of the first element matching all predicates, or None."""
+        matching = self.filter(**predicates) if predicates else self
+        return matching[0]['ELEMENT'] if matching else None
+
+    def _get_attribute(self, item):
+        elem, name = item
+        res = execute.get(self.session_url + '/element/' + elem + '/attribute/' + name)
+        return json.loads(res.text)['value']
+
+
+def _matcher(expected):
+    if callable(expected):
+        return expected
+    expected = str(expected)
+    if expected.startswith('regexp:'):
+        pattern = re.compile(expected[len('regexp:'):])
+        return lambda value: value is not None and pattern.search(str(value)) is not None
+    if '*' in expected or '?' in expected:
+        return lambda value: value is not None and fnmatch.fnmatchcase(str(value), expected)
+    return lambda value: value is not None and str(value) == expected
@@ -4,3 +4,15 @@ class Error(Exception):
 
     def __str__(self):
         return self.value
+
+
+class CircuitOpenError(Error):
+    """Raised without contacting the driver while the circuit breaker is open."""
+
+
+class DeadlineExceeded(Error):
+    """Raised when a request cannot complete within the remaining time of the keyword."""
+
+
+class DeferredCommandError(Error):
+    """Raised by the next request after a pipelined command failed, carrying the error of that command."""
@@ -1,22 +1,249 @@
 import requests
 import json
-from .errors import Error
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+from .deadline import remaining
+from .errors import Error, DeadlineExceeded
+from .pipeline import CommandPipeline
+from .retry import RetryPolicy, CircuitBreaker
+from .stats import stats
+
+policy = RetryPolicy()
+# Settings for the circuit breakers, which are kept separately for every driver host
+breaker_settings = {'failure_threshold': 5, 'reset_timeout': 30.0}
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# Headers sent with every request; the worker id lets a shared proxy queue each process fairly
+HEADERS = {'X-WAD-Worker': str(os.getpid())}
+
+# Callables called as listener(method, url, elapsed, ok) after every request attempt
+listeners = []
+
+# HTTP statuses treated as transient failures of the driver itself
+TRANSIENT_STATUSES = (502, 503, 504)
+# WebDriver status of the HTTP 500 responses Windows Application Driver sends on transient failures
+UNKNOWN_ERROR = 13
+
+# Seconds to wait for a connection, and default seconds to wait for a response
+CONNECT_TIMEOUT = 5.0
+DEFAULT_TIMEOUT = 20.0
+# Per-endpoint response timeouts as (method, url suffix, seconds); the first match wins
+ENDPOINT_TIMEOUTS = [
+    ('POST', '/session', 60.0),
+    ('GET', '/source', 30.0),
+]
+# Requests are not started when less than this many seconds of the deadline remain
+MIN_REQUEST_TIME = 0.05
+
+# Queue of deferred commands, sent in order in the background when enabled
+pipeline = CommandPipeline()
+
+# Whether identical idempotent requests sent at the same time share one request to the driver
+coalesce = False
+_inflight = {}
+_SESSION_URL = re.compile(r'^.*?/session/[^/]+')
+_inflight_lock = threading.Lock()
+
+
+class _Call:
+    """A request in flight that identical requests wait for instead of sending their own."""
+    __slots__ = ('done', 'response', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
 
 
 def get(url, params=None, catch_error=True, **kwargs):
-    return analyse(requests.get(url, params, **kwargs), catch_error)
+    return analyse(send('GET', url, idempotent=True, params=params, **kwargs), catch_error)
 
 
-def post(url, data=None, json=None, catch_error=True, **kwargs):
-    return analyse(requests.post(url, data, json, **kwargs), catch_error)
+def post(url, data=None, json=None, catch_error=True, idempotent=False, deferred=False, **kwargs):
+    """Sends a POST request, or with deferred and pipelining enabled queues it and returns None."""
+    if deferred and pipeline.enabled and not pipeline.is_sender():
+        pipeline.submit('POST ' + url, post, url, data=data, json=json, catch_error=catch_error,
+                        idempotent=idempotent, **kwargs)
+        return None
+    return analyse(send('POST', url, idempotent=idempotent, data=data, json=json, **kwargs), catch_error)
 
 
 def delete(url, catch_error=True, **kwargs):
-    return analyse(requests.delete(url, **kwargs), catch_error)
+    return analyse(send('DELETE', url, **kwargs), catch_error)
+
+
+def send(method, url, idempotent=False, **kwargs):
+    """Sends a request, retrying transient failures of idempotent requests.
+
+    Connection failures and transient HTTP statuses are retried, read timeouts are not.
+
+    Every request passes through the circuit breaker, so once the driver is down
+    requests fail immediately instead of waiting for a connection each time.
+    With coalescing enabled, an idempotent request identical to one already in
+    flight waits for that one and gets the same response, unless a change to the
+    session was sent in between. With pipelining enabled, every request first waits
+    for the queued deferred commands, raising their errors.
+    """
+    if pipeline.enabled:
+        pipeline.barrier()
+    if not idempotent and coalesce:
+        _detach_reads(url)
+    if not (idempotent and coalesce):
+        return _send(method, url, idempotent, **kwargs)
+    key = (method, url, json.dumps(kwargs, sort_keys=True, default=str))
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = _Call()
+    if not leader:
+        if not call.done.wait(remaining()):
+            raise DeadlineExceeded('Request ' + method + ' ' + url + ' was cut short by the keyword timeout')
+        if isinstance(call.error, DeadlineExceeded):
+            # The first request ran out of its own keyword's time, which may be shorter than ours
+            return _send(method, url, idempotent, **kwargs)
+        stats.increment('coalesced_requests')
+        if call.error is not None:
+            raise call.error
+        return call.response
+    try:
+        call.response = _send(method, url, idempotent, **kwargs)
+        return call.response
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            if _inflight.get(key) is call:
+                del _inflight[key]
+        call.done.set()
+
+
+def _detach_reads(url):
+    """Keeps reads of a session that are in flight from being shared with reads sent after a change to it."""
+    match = _SESSION_URL.match(url)
+    if match is None:
+        return
+    prefix = match.group(0)
+    with _inflight_lock:
+        for key in [key for key in _inflight if key[1] == prefix or key[1].startswith(prefix + '/')]:
+            del _inflight[key]
+
+
+def _send(method, url, idempotent=False, **kwargs):
+    attempts = policy.attempts if idempotent else 1
+    explicit_timeout = 'timeout' in kwargs
+    kwargs['headers'] = dict(HEADERS, **(kwargs.get('headers') or {}))
+    breaker = breaker_for(url)
+    retry = 0
+    while True:
+        breaker.before_request()
+        if not explicit_timeout:
+            kwargs['timeout'] = request_timeout(method, url)
+        start = time.time()
+        retryable = True
+        try:
+            res = requests.request(method, url, **kwargs)
+        except requests.ConnectionError as e:
+            # Includes connect timeouts
+            _notify(method, url, time.time() - start, False)
+            res = None
+            failure = e
+        except requests.Timeout as e:
+            _notify(method, url, time.time() - start, False)
+            left = remaining()
+            if left is not None and left < MIN_REQUEST_TIME:
+                raise DeadlineExceeded('Request ' + method + ' ' + url + ' was cut short by the keyword timeout')
+            # The driver got the request and may still be working on it, as it handles one request at
+            # a time sending it again would only queue more work behind it
+            res = None
+            failure = e
+            retryable = False
+        else:
+            transient = _is_transient(res)
+            _notify(method, url, time.time() - start, not transient)
+            if not transient:
+                breaker.record_success()
+                return res
+            failure = 'HTTP ' + str(res.status_code)
+        breaker.record_failure()
+        stats.increment('transport_errors')
+        retry += 1
+        if retry >= attempts or not retryable:
+            if res is not None:
+                return res
+            raise Error('Request ' + method + ' ' + url + ' failed: ' + str(failure))
+        delay = policy.delay(retry)
+        left = remaining()
+        if left is not None and left < delay + MIN_REQUEST_TIME:
+            raise DeadlineExceeded('Request ' + method + ' ' + url + ' could not be retried within the keyword '
+                                   'timeout: ' + str(failure))
+        stats.increment('retries')
+        time.sleep(delay)
+
+
+def breaker_for(url):
+    """Returns the circuit breaker of the driver host the url points to."""
+    host = urlsplit(url).netloc
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(**breaker_settings)
+        return breaker
+
+
+def reset_breakers(url=None):
+    """Discards the circuit breaker of the host url points to, or all of them, so that they are recreated
+    closed with the current settings."""
+    with _breakers_lock:
+        if url is None:
+            _breakers.clear()
+        else:
+            _breakers.pop(urlsplit(url).netloc, None)
+
+
+def _notify(method, url, elapsed, ok):
+    for listener in listeners:
+        listener(method, url, elapsed, ok)
+
+
+def request_timeout(method, url):
+    """Returns the (connect, read) timeout for a request, bounded by the current deadline."""
+    path = url.rstrip('/')
+    read = DEFAULT_TIMEOUT
+    for endpoint_method, suffix, seconds in ENDPOINT_TIMEOUTS:
+        if method == endpoint_method and path.endswith(suffix):
+            read = seconds
+            break
+    left = remaining()
+    if left is not None:
+        if left < MIN_REQUEST_TIME:
+            raise DeadlineExceeded('No time left for request ' + method + ' ' + url)
+        read = min(read, left)
+    return min(CONNECT_TIMEOUT, read), read
+
+
+def _is_transient(res):
+    if res.status_code in TRANSIENT_STATUSES:
+        return True
+    if res.status_code == 500:
+        # Other WebDriver statuses are answers of the driver and final, such as no such element
+        try:
+            return json.loads(res.text).get('status') == UNKNOWN_ERROR
+        except (ValueError, AttributeError):
+            return True
+    return False
 
 
 def analyse(res, catch_error):
-    json_obj = json.loads(res.text)
+    try:
+        json_obj = json.loads(res.text)
+    except ValueError:
+        raise Error('Invalid response from Windows Application Driver: HTTP ' + str(res.status_code))
     if json_obj['status'] == 0 or not catch_error:
         return res
     else:
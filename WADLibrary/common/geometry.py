@@ -0,0 +1,88 @@
+import re
+import threading
+from .errors import Error
+
+_RECT = re.compile(r'Left:(-?\d+)\s+Top:(-?\d+)\s+Width:(\d+)\s+Height:(\d+)')
+
+
+def parse_rect(text):
+    """Returns (x, y, width, height) of a BoundingRectangle attribute such as "Left:10 Top:20 Width:30 Height:40"."""
+    match = _RECT.search(text or '')
+    if match is None:
+        raise Error("Cannot read bounding rectangle '%s'" % text)
+    return tuple(int(value) for value in match.groups())
+
+
+class Geometry:
+    """Screen rectangle of an element together with the rectangle of its window when it was read."""
+    __slots__ = ('rect', 'window', 'uses')
+
+    def __init__(self, rect, window):
+        self.rect = rect
+        self.window = window
+        self.uses = 0
+
+    def center(self):
+        """Returns the center of the element relative to the top left corner of its window."""
+        x, y, width, height = self.rect
+        return x + width // 2 - self.window[0], y + height // 2 - self.window[1]
+
+
+class GeometryCache:
+    """Element rectangles per session and locator, valid as long as their window keeps its rectangle.
+
+    The rectangle of each session's window is kept too, so that clicks do not have to read it.
+    Every verify_every'th use of an entry is checked against the live element and window.
+    """
+    def __init__(self, verify_every=10):
+        self.enabled = False
+        self.verify_every = verify_every
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._windows = {}
+
+    def get(self, session_id, locator):
+        with self._lock:
+            return self._entries.get((session_id, locator))
+
+    def put(self, session_id, locator, rect, window):
+        with self._lock:
+            self._entries[(session_id, locator)] = Geometry(rect, window)
+
+    def window(self, session_id):
+        """Returns the remembered rectangle of the session's window, or None."""
+        with self._lock:
+            return self._windows.get(session_id)
+
+    def put_window(self, session_id, window):
+        with self._lock:
+            self._windows[session_id] = window
+
+    def forget_window(self, session_id):
+        with self._lock:
+            self._windows.pop(session_id, None)
+
+    def should_verify(self, geometry):
+        """Counts a use of the entry and tells whether this use has to be checked against the live element."""
+        with self._lock:
+            geometry.uses += 1
+            return self.verify_every > 0 and geometry.uses % self.verify_every == 0
+
+    def forget(self, session_id=None, locator=None):
+        """Drops entries, optionally only those of one session or one locator of a session.
+
+        Dropping all entries of a session also drops the rectangle of its window.
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if (session_id is None or key[0] == session_id) and (locator is None or key[1] == locator):
+                    del self._entries[key]
+            if locator is None:
+                if session_id is None:
+                    self._windows.clear()
+                else:
+                    self._windows.pop(session_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
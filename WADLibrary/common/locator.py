@@ -0,0 +1,80 @@
+from .errors import Error
+
+# Locator strategies understood by Windows Application Driver
+STRATEGIES = ('accessibility id', 'class name', 'id', 'name', 'tag name', 'xpath')
+
+_cache = {}
+_CACHE_LIMIT = 4096
+
+
+class Locator:
+    """Pre-parsed element locator.
+
+    Locators are immutable and validated when created, so a strategy typo fails before
+    any request is sent. Keywords accept either a Locator or a "locator_type:locator" string.
+    """
+    __slots__ = ('using', 'value')
+
+    def __init__(self, using, value):
+        using = using.strip().lower()
+        if using not in STRATEGIES:
+            raise Error("Unknown locator strategy '%s', expected one of: %s" % (using, ', '.join(STRATEGIES)))
+        object.__setattr__(self, 'using', using)
+        object.__setattr__(self, 'value', value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('Locator is immutable')
+
+    def __eq__(self, other):
+        return isinstance(other, Locator) and self.using == other.using and self.value == other.value
+
+    def __hash__(self):
+        return hash((self.using, self.value))
+
+    def __str__(self):
+        return self.using + ':' + self.value
+
+    def __repr__(self):
+        return 'Locator(%r, %r)' % (self.using, self.value)
+
+    def as_json(self, session_id):
+        return {'using': self.using, 'sessionId': session_id, 'value': self.value}
+
+
+def parse(locator):
+    """Returns a Locator for a "locator_type:locator" string, reusing previously parsed ones."""
+    if isinstance(locator, Locator):
+        return locator
+    try:
+        return _cache[locator]
+    except KeyError:
+        pass
+    if ':' not in locator:
+        raise Error("Locator '%s' is not in the format locator_type:locator" % locator)
+    using, value = locator.split(':', 1)
+    compiled = Locator(using, value)
+    if len(_cache) >= _CACHE_LIMIT:
+        _cache.clear()
+    _cache[locator] = compiled
+    return compiled
+
+
+def resolve(value, using='name'):
+    """Returns a Locator for keywords taking separate value and using arguments."""
+    if isinstance(value, Locator):
+        return value
+    key = (using, value)
+    try:
+        return _cache[key]
+    except KeyError:
+        pass
+    compiled = Locator(using, value)
+    if len(_cache) >= _CACHE_LIMIT:
+        _cache.clear()
+    _cache[key] = compiled
+    return compiled
+
+
+def parse_chain(args):
+    """Returns a tuple of Locators for a chain of locator arguments."""
+    return tuple(parse(arg) for arg in args)
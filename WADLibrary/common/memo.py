@@ -0,0 +1,60 @@
+import threading
+from contextlib import contextmanager
+from .stats import stats
+
+
+class ReadCache:
+    """Memoizes results of read-only queries until the next mutating action.
+
+    The cache is disabled by default. Keywords that change the application state clear the results
+    of every session, since the Root session sees the whole desktop and an action in one window can
+    change what other windows show. Keys start with the session id, so that the results of a deleted
+    session can be dropped on their own. Wait keywords bypass the cache so that polling always sees
+    the live state, and clear it when they finish.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.hits = 0
+        self.misses = 0
+        self._values = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def lookup(self, key, fetch):
+        """Returns the cached value for key, or calls fetch and caches its result unless it is None."""
+        if not self.enabled or getattr(self._local, 'suspended', 0):
+            return fetch()
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                stats.increment('read_cache_hits')
+                return self._values[key]
+        value = fetch()
+        with self._lock:
+            self.misses += 1
+            stats.increment('read_cache_misses')
+            if value is not None:
+                self._values[key] = value
+        return value
+
+    def clear(self, session_id=None):
+        """Clears the cached results of one session, or of all sessions when session_id is None."""
+        with self._lock:
+            if session_id is None:
+                self._values.clear()
+            else:
+                for key in [key for key in self._values if key[0] == session_id]:
+                    del self._values[key]
+
+    @contextmanager
+    def suspended(self):
+        """Bypasses the cache in the current thread inside the block."""
+        self._local.suspended = getattr(self._local, 'suspended', 0) + 1
+        try:
+            yield
+        finally:
+            self._local.suspended -= 1
+
+    def statistics(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._values)}
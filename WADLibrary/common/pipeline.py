@@ -0,0 +1,73 @@
+import threading
+from collections import deque
+from .errors import DeferredCommandError
+from .stats import stats
+
+
+class CommandPipeline:
+    """Sends commands whose responses nobody waits for in order on a background thread.
+
+    Commands are queued with submit and sent one after the other, so their order is kept. Errors
+    of queued commands are kept until the next barrier, which waits for the queue to empty and
+    raises the first of them.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._busy = False
+        self._errors = []
+        self._thread = None
+
+    def submit(self, description, func, *args, **kwargs):
+        """Queues func(*args, **kwargs), described in errors as description."""
+        with self._condition:
+            self._queue.append((description, func, args, kwargs))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='WADLibrary pipeline', daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+        stats.increment('pipelined_commands')
+
+    def is_sender(self):
+        return threading.current_thread() is self._thread
+
+    def pending(self):
+        with self._condition:
+            return bool(self._queue or self._busy or self._errors)
+
+    def barrier(self):
+        """Waits until all queued commands have been sent and raises the first error among them."""
+        if self.is_sender():
+            return
+        with self._condition:
+            while self._queue or self._busy:
+                self._condition.wait()
+            errors, self._errors = self._errors, []
+        if errors:
+            description, error = errors[0]
+            message = 'Deferred command %s failed: %s' % (description, error)
+            if len(errors) > 1:
+                message += ' (and %d more deferred commands failed)' % (len(errors) - 1)
+            raise DeferredCommandError(message)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    if not self._condition.wait(30):
+                        # Let the thread end when idle, submit starts a new one
+                        if not self._queue:
+                            self._thread = None
+                            return
+                description, func, args, kwargs = self._queue.popleft()
+                self._busy = True
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                with self._condition:
+                    self._errors.append((description, e))
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
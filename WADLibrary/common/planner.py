@@ -0,0 +1,173 @@
+import re
+import threading
+from .locator import Locator
+
+# Element attributes that Windows Application Driver can look up without walking the tree with XPath
+ATTRIBUTE_STRATEGIES = {'AutomationId': 'accessibility id', 'Name': 'name', 'ClassName': 'class name'}
+# Strategies tried first while there are no observed costs, cheapest first
+PREFERENCE = ('accessibility id', 'name', 'class name', 'tag name')
+
+_TAG = re.compile(r'^(\*|[A-Za-z_][\w.-]*)$')
+_PREDICATE = re.compile(r'''\s*@(\w+)\s*=\s*(?:'([^']*)'|"([^"]*)")\s*(?:\band\b|$)''')
+
+
+class PlanStep:
+    """One step of a planned query: alternative locators finding the element and checks it has to pass.
+
+    Checks map attribute names to their expected values, with the tag checked under the key None.
+    """
+    __slots__ = ('candidates', 'checks')
+
+    def __init__(self, candidates, checks):
+        self.candidates = candidates
+        self.checks = checks
+
+
+class QueryPlanner:
+    """Rewrites XPath queries into chains of cheap lookups and keeps track of what each lookup costs.
+
+    Only queries made of descendant steps (//) are rewritten, optionally starting with one absolute
+    step (/Window[...]). Each step needs a tag or an attribute predicate on AutomationId, Name or
+    ClassName, joined with "and". The step is looked up with the strategy that has been cheapest so
+    far, and the tag and any other predicates are checked on the element found. Queries where the
+    rewrite does not match or turns out slower than XPath are sent as XPath from then on.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._plans = {}
+        self._strategies = {}
+        self._queries = {}
+
+    def plan(self, xpath):
+        """Returns the steps of a rewritten query, or None if the query has to be sent as XPath."""
+        with self._lock:
+            if xpath in self._plans:
+                return self._plans[xpath]
+        steps = _plan(xpath)
+        with self._lock:
+            self._plans[xpath] = steps
+        return steps
+
+    def choose(self, step):
+        """Returns the locator of the step whose strategy has the lowest observed mean cost.
+
+        Strategies not observed yet are tried first, in the order of PREFERENCE.
+        """
+        with self._lock:
+            def cost(locator):
+                count, total = self._strategies.get(locator.using, (0, 0.0))
+                return (total / count if count else 0.0, PREFERENCE.index(locator.using))
+            return min(step.candidates, key=cost)
+
+    def prefer_xpath(self, xpath):
+        """Tells whether the query should be sent as XPath based on how earlier attempts went."""
+        with self._lock:
+            query = self._queries.get(xpath)
+        if query is None:
+            return False
+        if query['misses'] and not query['planned'][0]:
+            return True
+        planned, raw = query['planned'], query['xpath']
+        return bool(planned[0] and raw[0]) and raw[1] / raw[0] < planned[1] / planned[0]
+
+    def record_strategy(self, using, elapsed):
+        with self._lock:
+            count, total = self._strategies.get(using, (0, 0.0))
+            self._strategies[using] = (count + 1, total + elapsed)
+
+    def record_query(self, xpath, kind, elapsed):
+        """Records the time a query took when sent as planned lookups ('planned') or as XPath ('xpath')."""
+        with self._lock:
+            query = self._queries.setdefault(xpath, {'planned': [0, 0.0], 'xpath': [0, 0.0], 'misses': 0})
+            query[kind][0] += 1
+            query[kind][1] += elapsed
+
+    def record_miss(self, xpath):
+        """Records that the planned lookups did not find an element that XPath then found."""
+        with self._lock:
+            query = self._queries.setdefault(xpath, {'planned': [0, 0.0], 'xpath': [0, 0.0], 'misses': 0})
+            query['misses'] += 1
+
+    def statistics(self):
+        with self._lock:
+            strategies = {using: {'count': count, 'mean': total / count}
+                          for using, (count, total) in self._strategies.items()}
+            queries = {}
+            for xpath, query in self._queries.items():
+                queries[xpath] = {'rewritten': self._plans.get(xpath) is not None, 'misses': query['misses']}
+                for kind in ('planned', 'xpath'):
+                    count, total = query[kind]
+                    queries[xpath][kind] = {'count': count, 'mean': total / count if count else None}
+        return {'strategies': strategies, 'queries': queries}
+
+
+def _split(xpath):
+    """Splits an XPath into (axis, step) pairs, or returns None if it is not a plain location path."""
+    steps = []
+    i = 0
+    while i < len(xpath):
+        if xpath.startswith('//', i):
+            axis, i = '//', i + 2
+        elif xpath[i] == '/':
+            axis, i = '/', i + 1
+        else:
+            return None
+        start = i
+        quote = None
+        depth = 0
+        while i < len(xpath) and (quote or depth or xpath[i] != '/'):
+            char = xpath[i]
+            if quote:
+                if char == quote:
+                    quote = None
+            elif char in '\'"':
+                quote = char
+            elif char == '[':
+                depth += 1
+            elif char == ']':
+                depth -= 1
+            i += 1
+        if quote or depth or start == i:
+            return None
+        steps.append((axis, xpath[start:i].strip()))
+    return steps
+
+
+def _plan(xpath):
+    steps = _split(xpath.strip())
+    if not steps:
+        return None
+    planned = []
+    for index, (axis, step) in enumerate(steps):
+        # A child step below the first one cannot be expressed with lookups, which search all descendants
+        if axis == '/' and index > 0:
+            return None
+        tag, predicates = step, ''
+        if step.endswith(']') and '[' in step:
+            tag, predicates = step[:-1].split('[', 1)
+            tag = tag.strip()
+        if not _TAG.match(tag):
+            return None
+        attributes = {}
+        position = 0
+        while position < len(predicates):
+            match = _PREDICATE.match(predicates, position)
+            if match is None:
+                return None
+            value = match.group(2) if match.group(2) is not None else match.group(3)
+            attributes[match.group(1)] = value
+            position = match.end()
+        candidates = [Locator(ATTRIBUTE_STRATEGIES[name], value) for name, value in attributes.items()
+                      if name in ATTRIBUTE_STRATEGIES]
+        # The first element of a tag rarely passes the checks of other predicates, so tags are only
+        # looked up on their own
+        if not candidates and tag != '*':
+            candidates.append(Locator('tag name', tag))
+        if not candidates:
+            return None
+        checks = dict(attributes)
+        if tag != '*':
+            checks[None] = tag
+        planned.append(PlanStep(candidates, checks))
+    return planned
@@ -0,0 +1,20 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# Upper limit of parallel requests sent by bulk operations
+MAX_WORKERS = 8
+
+
+def run_concurrently(func, items, max_workers=None):
+    """Calls func for every item in parallel threads and returns the results in the order of items.
+
+    Each call runs in a copy of the caller's context, so deadlines set by the calling keyword still
+    apply. The first exception raised by any call is re-raised after all calls have finished.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    workers = min(max_workers or MAX_WORKERS, len(items))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, func, item) for item in items]
+        return [future.result() for future in futures]
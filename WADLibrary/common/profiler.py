@@ -0,0 +1,151 @@
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+
+# Files whose frames are on top of the stack while waiting for the driver to respond
+_NETWORK_FILES = ('socket.py', 'ssl.py', 'selectors.py', 'connection.py', 'wait.py')
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class KeywordProfiler:
+    """Profiles the library's keywords one at a time and aggregates the results per keyword.
+
+    Each keyword runs under cProfile with the CPU time of its thread as the clock, so time spent
+    blocked on the driver, and work of other threads, does not count. A sampling thread additionally
+    records the stack of the keyword's thread every interval, leaving out samples taken while waiting
+    for the network, for flame graphs.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.interval = 0.005
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._stacks = {}
+        self._current = {}
+        self._sampler = None
+        self._stop_event = threading.Event()
+
+    def start(self, interval=0.005):
+        self.interval = float(interval)
+        with self._lock:
+            self._stats = {}
+            self._stacks = {}
+            self._current = {}
+        self._stop_event.clear()
+        self.enabled = True
+        if self.interval > 0:
+            self._sampler = threading.Thread(target=self._sample, name='WADLibrary profiler', daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        self.enabled = False
+        self._stop_event.set()
+        if self._sampler is not None:
+            self._sampler.join(1)
+            self._sampler = None
+
+    def begin(self, name):
+        """Starts profiling a keyword on the calling thread, unless one is already profiled there."""
+        if not self.enabled:
+            return
+        thread = threading.get_ident()
+        with self._lock:
+            if thread in self._current:
+                return
+        profile = cProfile.Profile(time.thread_time)
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler or debugger is active on this thread
+            return
+        with self._lock:
+            self._current[thread] = (name, profile)
+
+    def end(self, name):
+        thread = threading.get_ident()
+        with self._lock:
+            current = self._current.get(thread)
+            if current is None or current[0] != name:
+                return
+            del self._current[thread]
+        profile = current[1]
+        profile.disable()
+        profile.create_stats()
+        with self._lock:
+            if name in self._stats:
+                self._stats[name].add(profile)
+            else:
+                self._stats[name] = pstats.Stats(profile)
+
+    def write(self, directory):
+        """Writes a pstats file per keyword and one collapsed stack file, returning the files written."""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            keyword_stats = dict(self._stats)
+            stacks = dict(self._stacks)
+        written = []
+        for name, keyword in sorted(keyword_stats.items()):
+            path = os.path.join(directory, re.sub(r'[^\w.-]+', '_', name) + '.pstats')
+            keyword.dump_stats(path)
+            written.append(path)
+        path = os.path.join(directory, 'wadlibrary.collapsed')
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(stacks.items()):
+                f.write('%s %d\n' % (stack, count))
+        written.append(path)
+        return written
+
+    def summary(self, limit=10):
+        """Returns the keywords with the most CPU time spent in the library, as (name, calls, seconds)."""
+        with self._lock:
+            keyword_stats = dict(self._stats)
+        totals = [(name, keyword.total_calls, keyword.total_tt) for name, keyword in keyword_stats.items()]
+        return sorted(totals, key=lambda total: total[2], reverse=True)[:limit]
+
+    def _sample(self):
+        while not self._stop_event.wait(self.interval):
+            with self._lock:
+                current = dict(self._current)
+            if not current:
+                continue
+            frames = sys._current_frames()
+            for thread, (name, _) in current.items():
+                frame = frames.get(thread)
+                if frame is None or os.path.basename(frame.f_code.co_filename) in _NETWORK_FILES:
+                    continue
+                stack = []
+                outermost = None
+                while frame is not None:
+                    filename = frame.f_code.co_filename
+                    if filename.startswith(_PACKAGE_DIR):
+                        outermost = len(stack)
+                    stack.append('%s (%s)' % (frame.f_code.co_name, os.path.basename(filename)))
+                    frame = frame.f_back
+                if outermost is None:
+                    continue
+                # Frames of Robot Framework calling the keyword are left out
+                stack = stack[:outermost + 1]
+                stack.append(name.replace(';', ','))
+                key = ';'.join(reversed(stack))
+                with self._lock:
+                    self._stacks[key] = self._stacks.get(key, 0) + 1
+
+
+profiler = KeywordProfiler()
+
+
+class ProfileListener:
+    """Robot Framework listener profiling every keyword of the library while profiling is enabled."""
+    ROBOT_LISTENER_API_VERSION = 2
+
+    def start_keyword(self, name, attrs):
+        if attrs.get('libname') == 'WADLibrary':
+            profiler.begin(name)
+
+    def end_keyword(self, name, attrs):
+        if attrs.get('libname') == 'WADLibrary':
+            profiler.end(name)
@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+from .errors import Error
+from .locator import parse_chain
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+class ScreenLocator:
+    """A named locator chain of a screen, with statistics of how long resolving it took."""
+    __slots__ = ('screen', 'name', 'chain', 'resolutions', 'total_time', 'last_time')
+
+    def __init__(self, screen, name, chain):
+        self.screen = screen
+        self.name = name
+        self.chain = chain
+        self.resolutions = 0
+        self.total_time = 0.0
+        self.last_time = None
+
+    def record(self, elapsed):
+        self.resolutions += 1
+        self.total_time += elapsed
+        self.last_time = elapsed
+
+    def as_dict(self):
+        return {'screen': self.screen, 'name': self.name, 'locator': ' > '.join(str(loc) for loc in self.chain),
+                'resolutions': self.resolutions, 'last_time': self.last_time,
+                'mean_time': self.total_time / self.resolutions if self.resolutions else None}
+
+
+class LocatorRepository:
+    """Locators grouped by screen, with a cache of the elements they resolved to in each session.
+
+    The repository file maps screen names to locator names to locators. A locator is either a
+    "locator_type:locator" string or a list of them forming a chain, e.g. in YAML:
+    | Calculator:
+    |   one: accessibility id:num1Button
+    |   result: [accessibility id:CalculatorResults, class name:TextBlock]
+    """
+    def __init__(self, screens):
+        self.screens = {}
+        for screen, entries in screens.items():
+            self.screens[screen] = {}
+            for name, value in entries.items():
+                chain = parse_chain([value] if isinstance(value, str) else value)
+                if not chain:
+                    raise Error("Locator '%s' of screen '%s' is empty" % (name, screen))
+                self.screens[screen][name] = ScreenLocator(screen, name, chain)
+        self._elements = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Loads a repository from a JSON file, or from a YAML file if PyYAML is installed."""
+        with open(path, encoding='utf-8') as f:
+            if path.lower().endswith(('.yaml', '.yml')):
+                if yaml is None:
+                    raise Error('Loading YAML locator repositories requires PyYAML: pip install pyyaml')
+                screens = yaml.safe_load(f)
+            else:
+                screens = json.load(f)
+        return cls(screens or {})
+
+    def get(self, screen, name):
+        try:
+            return self.screens[screen][name]
+        except KeyError:
+            raise Error("No locator '%s' in screen '%s' of the locator repository" % (name, screen))
+
+    def screen(self, screen):
+        try:
+            return list(self.screens[screen].values())
+        except KeyError:
+            raise Error("No screen '%s' in the locator repository" % screen)
+
+    def resolve(self, locator, session_id, find):
+        """Returns the element the locator resolves to in the session, calling find(chain) when not cached."""
+        key = (session_id, locator.screen, locator.name)
+        with self._lock:
+            elem = self._elements.get(key)
+        if elem is not None:
+            return elem
+        start = time.time()
+        elem = find(locator.chain)
+        with self._lock:
+            locator.record(time.time() - start)
+            self._elements[key] = elem
+        return elem
+
+    def forget(self, session_id=None, screen=None, name=None):
+        """Drops cached elements, optionally only those of one session, screen or locator."""
+        with self._lock:
+            for key in list(self._elements):
+                if (session_id is None or key[0] == session_id) and (screen is None or key[1] == screen) and \
+                        (name is None or key[2] == name):
+                    del self._elements[key]
+
+    def timings(self):
+        """Returns the statistics of all resolved locators, slowest first."""
+        with self._lock:
+            resolved = [locator.as_dict() for entries in self.screens.values() for locator in entries.values()
+                        if locator.resolutions]
+        return sorted(resolved, key=lambda entry: entry['mean_time'], reverse=True)
@@ -0,0 +1,81 @@
+import threading
+import time
+from robot.api import logger
+from .errors import CircuitOpenError
+from .stats import stats
+
+
+class RetryPolicy:
+    """Capped exponential backoff for retrying idempotent requests.
+
+    Arguments detailed:
+    | =Argument=  | =Input=                                          |
+    | attempts    | Total number of tries, including the first one   |
+    | backoff     | Delay in seconds before the first retry          |
+    | max_backoff | Upper limit for the delay between two tries      |
+    | factor      | Multiplier applied to the delay after each retry |
+    """
+    def __init__(self, attempts=3, backoff=0.2, max_backoff=2.0, factor=2.0):
+        self.attempts = max(1, int(attempts))
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self.factor = float(factor)
+
+    def delay(self, retry):
+        """Returns the delay before the given retry, counting retries from 1."""
+        return min(self.max_backoff, self.backoff * self.factor ** (retry - 1))
+
+
+class CircuitBreaker:
+    """Fails requests fast once the driver has failed too many times in a row.
+
+    After failure_threshold consecutive transport failures the circuit opens and every request
+    is rejected for reset_timeout seconds. The next request after that is let through as a trial:
+    success closes the circuit, failure opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self.state = self.CLOSED
+
+    def before_request(self):
+        with self._lock:
+            if self.state != self.OPEN:
+                return
+            if time.time() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return
+        stats.increment('breaker_rejected')
+        raise CircuitOpenError('Windows Application Driver is not responding, circuit breaker is open for '
+                               '%.1f more seconds' % (self._opened_at + self.reset_timeout - time.time()))
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                stats.increment('breaker_closed')
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or \
+                    (self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = time.time()
+                stats.increment('breaker_opened')
+                logger.warn('Windows Application Driver failed %d times in a row, failing fast for %s seconds'
+                            % (self._failures, self.reset_timeout))
+
+    def reset(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self.state = self.CLOSED
@@ -0,0 +1,140 @@
+import csv
+import json
+import threading
+import time
+from collections import deque
+import psutil
+
+METRICS = ('cpu', 'rss', 'handles', 'threads')
+
+
+class ResourceSampler(threading.Thread):
+    """Samples resource usage of the driver, the applications under test and the host in the background.
+
+    Every interval one sample per group is appended to a ring buffer holding the newest capacity samples.
+    Groups are the driver process with its children ('driver'), each named application process
+    (summed over all its instances) and the whole host ('host').
+
+    Arguments detailed:
+    | =Argument= | =Input=                                                      |
+    | driver_pid | Process id of Windows Application Driver, or None            |
+    | names      | Process names of the applications, e.g. ["calc.exe"]         |
+    | interval   | Seconds between samples                                      |
+    | capacity   | Number of samples kept in the ring buffer                    |
+    """
+    # Process lists of the named applications are refreshed every this many samples
+    RESCAN_EVERY = 10
+
+    def __init__(self, driver_pid=None, names=(), interval=1.0, capacity=3600):
+        threading.Thread.__init__(self, name='WADLibrary resource sampler', daemon=True)
+        self.driver_pid = driver_pid
+        self.names = [name.lower() for name in names]
+        self.interval = float(interval)
+        self.samples = deque(maxlen=int(capacity))
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes = {}
+        self._groups = {}
+        self._ticks = 0
+
+    def run(self):
+        psutil.cpu_percent(None)
+        while not self._stop_event.is_set():
+            start = time.time()
+            self.sample()
+            self._stop_event.wait(max(0.0, self.interval - (time.time() - start)))
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(self.interval + 5)
+
+    def sample(self):
+        """Takes one sample of every group."""
+        if self._ticks % self.RESCAN_EVERY == 0:
+            self._scan()
+        self._ticks += 1
+        now = time.time()
+        rows = []
+        for group, pids in self._groups.items():
+            totals = dict.fromkeys(METRICS, 0)
+            for pid in list(pids):
+                usage = self._usage(pid)
+                if usage is None:
+                    pids.discard(pid)
+                    continue
+                for metric in METRICS:
+                    totals[metric] += usage[metric]
+            rows.append(dict(totals, time=now, group=group))
+        memory = psutil.virtual_memory()
+        rows.append({'time': now, 'group': 'host', 'cpu': psutil.cpu_percent(None), 'rss': memory.used,
+                     'handles': 0, 'threads': 0})
+        with self._lock:
+            self.samples.extend(rows)
+
+    def summary(self):
+        """Returns minimum, mean and maximum of every metric for every group."""
+        with self._lock:
+            samples = list(self.samples)
+        groups = {}
+        for row in samples:
+            groups.setdefault(row['group'], []).append(row)
+        result = {}
+        for group, rows in groups.items():
+            result[group] = {}
+            for metric in METRICS:
+                values = [row[metric] for row in rows]
+                result[group][metric] = {'min': min(values), 'mean': sum(values) / len(values),
+                                         'max': max(values)}
+        return result
+
+    def export(self, path):
+        """Writes the buffered time series to path, as JSON if it ends with .json and as CSV otherwise."""
+        with self._lock:
+            samples = list(self.samples)
+        fields = ('time', 'group') + METRICS
+        with open(path, 'w', newline='') as f:
+            if path.lower().endswith('.json'):
+                json.dump(samples, f)
+            else:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(samples)
+
+    def _scan(self):
+        groups = {}
+        if self.driver_pid is not None:
+            try:
+                driver = psutil.Process(self.driver_pid)
+                groups['driver'] = {driver.pid} | {child.pid for child in driver.children(recursive=True)}
+            except psutil.Error:
+                pass
+        if self.names:
+            for process in psutil.process_iter(['name']):
+                name = (process.info['name'] or '').lower()
+                if name in self.names:
+                    groups.setdefault(name, set()).add(process.pid)
+        for name in self.names:
+            groups.setdefault(name, set())
+        self._groups = groups
+        alive = set().union(*groups.values()) if groups else set()
+        for pid in list(self._processes):
+            if pid not in alive:
+                del self._processes[pid]
+
+    def _usage(self, pid):
+        process = self._processes.get(pid)
+        try:
+            if process is None:
+                process = self._processes[pid] = psutil.Process(pid)
+                process.cpu_percent(None)
+            with process.oneshot():
+                if hasattr(process, 'num_handles'):
+                    handles = process.num_handles()
+                else:
+                    handles = process.num_fds()
+                return {'cpu': process.cpu_percent(None), 'rss': process.memory_info().rss,
+                        'handles': handles, 'threads': process.num_threads()}
+        except psutil.Error:
+            self._processes.pop(pid, None)
+            return None
@@ -0,0 +1,165 @@
+import threading
+import time
+import weakref
+import requests
+from .errors import Error
+
+# Schedulers of the live library instances, all fed by one request listener
+_schedulers = weakref.WeakSet()
+
+
+def record_request(method, url, elapsed, ok):
+    """Request listener passing every request on to the schedulers whose endpoints it went to."""
+    for scheduler in list(_schedulers):
+        scheduler.record(method, url, elapsed, ok)
+
+
+class Endpoint:
+    """Load and health bookkeeping for a single Windows Application Driver host."""
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.sessions = 0
+        self.latency = None
+        self.failures = 0
+        self.healthy = True
+
+    def as_dict(self):
+        return {'url': self.url, 'sessions': self.sessions, 'latency': self.latency,
+                'failures': self.failures, 'healthy': self.healthy}
+
+
+class EndpointScheduler:
+    """Places new suites on the least loaded healthy driver host and keeps sessions on their host.
+
+    Load is the number of sessions open on a host, asked from the host itself so that sessions of
+    other processes count too, with the recent average request latency used to break ties. Hosts
+    whose latency is not known yet come after hosts with a known latency. A host is marked unhealthy
+    after max_failures failed requests in a row and is taken into use again once a health check
+    succeeds.
+
+    Arguments detailed:
+    | =Argument=   | =Input=                                                     |
+    | urls         | Driver endpoints as a list or a comma separated string      |
+    | max_failures | Consecutive failed requests after which a host is unhealthy |
+    | alpha        | Weight of the newest sample in the latency average          |
+    """
+    def __init__(self, urls, max_failures=3, alpha=0.3):
+        if isinstance(urls, str):
+            urls = urls.split(',')
+        self.endpoints = [Endpoint(url.strip()) for url in urls if url.strip()]
+        if not self.endpoints:
+            raise Error('No Windows Application Driver endpoints given')
+        self.max_failures = max_failures
+        self.alpha = alpha
+        self._affinity = {}
+        self._lock = threading.Lock()
+        _schedulers.add(self)
+
+    def acquire(self):
+        """Returns the url of the least loaded healthy endpoint."""
+        with self._lock:
+            healthy = [endpoint for endpoint in self.endpoints if endpoint.healthy]
+        if not healthy:
+            self.check_health()
+            with self._lock:
+                healthy = [endpoint for endpoint in self.endpoints if endpoint.healthy]
+            if not healthy:
+                raise Error('None of the Windows Application Driver endpoints are healthy: ' +
+                            ', '.join(endpoint.url for endpoint in self.endpoints))
+        loads = {endpoint.url: self._load(endpoint) for endpoint in healthy}
+        with self._lock:
+            # Endpoints that could not be reached come last
+            best = min(healthy, key=lambda endpoint: (loads[endpoint.url] is None, loads[endpoint.url] or 0,
+                                                      endpoint.latency is None, endpoint.latency or 0.0))
+            return best.url
+
+    def _load(self, endpoint, timeout=2.0):
+        """Returns the number of sessions open on the endpoint, or those bound to it if it cannot tell.
+
+        Returns None if the endpoint cannot be reached.
+        """
+        start = time.time()
+        try:
+            res = requests.get(endpoint.url + '/sessions', timeout=timeout)
+        except requests.RequestException:
+            return None
+        try:
+            sessions = len(res.json()['value']) if res.status_code == 200 else None
+        except (KeyError, TypeError, ValueError):
+            sessions = None
+        with self._lock:
+            if sessions is None:
+                return endpoint.sessions
+            if endpoint.latency is None:
+                endpoint.latency = time.time() - start
+            return sessions
+
+    def bind(self, session_id, url):
+        """Pins a session to the endpoint it was created on."""
+        with self._lock:
+            if session_id in self._affinity:
+                return
+            endpoint = self._find(url)
+            self._affinity[session_id] = endpoint
+            endpoint.sessions += 1
+
+    def release(self, session_id):
+        with self._lock:
+            endpoint = self._affinity.pop(session_id, None)
+            if endpoint is not None:
+                endpoint.sessions -= 1
+
+    def endpoint_for(self, session_id, default=None):
+        """Returns the url of the endpoint the session is bound to."""
+        with self._lock:
+            endpoint = self._affinity.get(session_id)
+        return endpoint.url if endpoint is not None else default
+
+    def record(self, method, url, elapsed, ok):
+        """Request listener updating the latency and health of the endpoint the url belongs to."""
+        with self._lock:
+            endpoint = self._match(url)
+            if endpoint is None:
+                return
+            if ok:
+                endpoint.failures = 0
+                endpoint.healthy = True
+                if endpoint.latency is None:
+                    endpoint.latency = elapsed
+                else:
+                    endpoint.latency = self.alpha * elapsed + (1 - self.alpha) * endpoint.latency
+            else:
+                endpoint.failures += 1
+                if endpoint.failures >= self.max_failures:
+                    endpoint.healthy = False
+
+    def check_health(self, timeout=2.0):
+        """Queries the status of every endpoint and updates its health and latency."""
+        for endpoint in self.endpoints:
+            start = time.time()
+            try:
+                ok = requests.get(endpoint.url + '/status', timeout=timeout).status_code == 200
+            except requests.RequestException:
+                ok = False
+            with self._lock:
+                endpoint.healthy = ok
+                endpoint.failures = 0 if ok else max(endpoint.failures, self.max_failures)
+                if ok and endpoint.latency is None:
+                    endpoint.latency = time.time() - start
+        return [endpoint.as_dict() for endpoint in self.endpoints]
+
+    def statistics(self):
+        with self._lock:
+            return [endpoint.as_dict() for endpoint in self.endpoints]
+
+    def _find(self, url):
+        endpoint = self._match(url)
+        if endpoint is None:
+            raise Error("'%s' is not one of the scheduled endpoints" % url)
+        return endpoint
+
+    def _match(self, url):
+        for endpoint in self.endpoints:
+            if url == endpoint.url or url.startswith(endpoint.url + '/'):
+                return endpoint
+        return None
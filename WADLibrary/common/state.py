@@ -0,0 +1,45 @@
+import json
+import os
+import psutil
+
+# Bumped whenever the layout of the state file changes, so that older files are ignored
+STATE_VERSION = 1
+
+
+def load_state(path):
+    """Returns the state saved in path, or None if there is none or it cannot be used."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+        return None
+    return state
+
+
+def save_state(path, state):
+    """Writes state to path, replacing the file at once so that no process reads a half written file."""
+    state = dict(state, version=STATE_VERSION)
+    temporary = '%s.%d.tmp' % (path, os.getpid())
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temporary, path)
+
+
+def remove_state(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def process_alive(pid, created=None):
+    """Tells whether the process is running and, if its creation time is given, is the same process."""
+    if pid is None:
+        return True
+    try:
+        process = psutil.Process(pid)
+        return process.is_running() and (created is None or abs(process.create_time() - created) < 1.0)
+    except psutil.Error:
+        return False
@@ -0,0 +1,40 @@
+import threading
+
+
+class Statistics:
+    """Thread-safe named counters describing what the library did on the wire."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_max(self, name, value):
+        with self._lock:
+            if value > self._counters.get(name, 0):
+                self._counters[name] = value
+
+    def get(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+stats = Statistics()
+
+
+def percentile(ordered, percent):
+    """Returns the value at percent (0-100) of an already sorted list, or 0.0 for an empty list."""
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(percent / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,89 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+_SESSION_RE = re.compile(r'/session/([^/]+)')
+
+
+class Tracer:
+    """Collects spans in Chrome trace event format in a bounded in-memory buffer.
+
+    While disabled, every method returns immediately, so instrumented code costs next to nothing.
+    The buffer keeps the newest capacity events and is written out with flush.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.events = deque()
+        self._pid = os.getpid()
+
+    def start(self, capacity=200000):
+        self.events = deque(maxlen=int(capacity))
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    @contextmanager
+    def span(self, name, category, **args):
+        """Records the block as a span on the current thread."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, category, start, time.perf_counter() - start, args)
+
+    def complete(self, name, category, start, duration, args=None):
+        """Records a finished span that started at the time.perf_counter() value start."""
+        if self.enabled:
+            self.events.append({'name': name, 'cat': category, 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6,
+                                'pid': self._pid, 'tid': threading.get_ident(), 'args': args or {}})
+
+    def begin(self, name, category, args=None):
+        if self.enabled:
+            self.events.append({'name': name, 'cat': category, 'ph': 'B', 'ts': time.perf_counter() * 1e6,
+                                'pid': self._pid, 'tid': threading.get_ident(), 'args': args or {}})
+
+    def end(self, name, category, args=None):
+        if self.enabled:
+            self.events.append({'name': name, 'cat': category, 'ph': 'E', 'ts': time.perf_counter() * 1e6,
+                                'pid': self._pid, 'tid': threading.get_ident(), 'args': args or {}})
+
+    def record_request(self, method, url, elapsed, ok):
+        """Request listener recording every request to the driver as a span."""
+        if self.enabled:
+            match = _SESSION_RE.search(url)
+            args = {'url': url, 'ok': ok}
+            if match:
+                args['session_id'] = match.group(1)
+            name = method + ' ' + _SESSION_RE.sub('/session/{id}', urlsplit(url).path)
+            self.complete(name, 'http', time.perf_counter() - elapsed, elapsed, args)
+
+    def flush(self, path):
+        """Writes the buffered events to path as a Chrome/Perfetto trace and empties the buffer."""
+        events = list(self.events)
+        self.events.clear()
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+
+tracer = Tracer()
+
+
+class KeywordListener:
+    """Robot Framework listener recording every keyword as a span while tracing is enabled."""
+    ROBOT_LISTENER_API_VERSION = 2
+
+    def start_keyword(self, name, attrs):
+        tracer.begin(name, 'keyword', {'library': attrs.get('libname'), 'args': list(attrs.get('args', ()))})
+
+    def end_keyword(self, name, attrs):
+        tracer.end(name, 'keyword', {'status': attrs.get('status')})
@@ -0,0 +1,101 @@
+import hashlib
+import xml.etree.ElementTree as ElementTree
+from .errors import Error
+
+# Attributes identifying an element across snapshots, in order of preference
+IDENTITY_ATTRIBUTES = ('RuntimeId', 'AutomationId')
+
+
+class Node:
+    """An element of a page source snapshot, with a hash covering it and all its descendants."""
+    __slots__ = ('tag', 'attributes', 'children', 'key', 'digest', 'path', 'size')
+
+    def __init__(self, tag, attributes, children, key, path):
+        self.tag = tag
+        self.attributes = attributes
+        self.children = children
+        self.key = key
+        self.path = path
+        self.size = 1 + sum(child.size for child in children)
+        digest = hashlib.sha1(tag.encode('utf-8'))
+        for name in sorted(attributes):
+            digest.update(('\0%s=%s' % (name, attributes[name])).encode('utf-8'))
+        for child in children:
+            digest.update(child.digest)
+        self.digest = digest.digest()
+
+    def describe(self, changes=None):
+        description = {'tag': self.tag, 'name': self.attributes.get('Name'),
+                       'automation_id': self.attributes.get('AutomationId'),
+                       'runtime_id': self.attributes.get('RuntimeId'), 'path': self.path,
+                       'descendants': self.size - 1}
+        if changes is not None:
+            description['changes'] = changes
+        return description
+
+
+def parse(source, ignore=()):
+    """Parses the page source of a session into a tree of nodes.
+
+    Attributes named in ignore, e.g. coordinates that change whenever a window moves, are left out of
+    the hashes and are not reported as changes.
+    """
+    try:
+        root = ElementTree.fromstring(source)
+    except ElementTree.ParseError as e:
+        raise Error('Page source is not valid XML: %s' % e)
+    return _build(root, _key(root, {}), '', frozenset(ignore))
+
+
+def _key(element, seen):
+    for name in IDENTITY_ATTRIBUTES:
+        value = element.get(name)
+        if value:
+            key = '%s:%s' % (name, value)
+            break
+    else:
+        key = '%s:%s' % (element.tag, element.get('Name', ''))
+    # Siblings with the same key are told apart by their order
+    seen[key] = seen.get(key, 0) + 1
+    return key if seen[key] == 1 else '%s#%d' % (key, seen[key])
+
+
+def _build(element, key, parent_path, ignore):
+    attributes = {name: value for name, value in element.attrib.items() if name not in ignore}
+    name = attributes.get('Name') or attributes.get('AutomationId')
+    path = '%s/%s' % (parent_path, element.tag + ("[%s]" % name if name else ''))
+    seen = {}
+    children = [_build(child, _key(child, seen), path, ignore) for child in element]
+    return Node(element.tag, attributes, children, key, path)
+
+
+def diff(before, after):
+    """Returns the added, removed and changed elements between two snapshot trees.
+
+    Subtrees with the same hash in both snapshots are skipped without visiting them. Added and
+    removed subtrees are reported by their topmost element only.
+    """
+    added, removed, changed = [], [], []
+    pending = [(before, after)]
+    while pending:
+        old, new = pending.pop()
+        if old.digest == new.digest:
+            continue
+        if old.tag != new.tag:
+            removed.append(old.describe())
+            added.append(new.describe())
+            continue
+        changes = {name: [old.attributes.get(name), new.attributes.get(name)]
+                   for name in set(old.attributes) | set(new.attributes)
+                   if old.attributes.get(name) != new.attributes.get(name)}
+        if changes:
+            changed.append(new.describe(changes))
+        old_children = {child.key: child for child in old.children}
+        for child in new.children:
+            match = old_children.pop(child.key, None)
+            if match is None:
+                added.append(child.describe())
+            else:
+                pending.append((match, child))
+        removed.extend(child.describe() for child in old_children.values())
+    return {'added': added, 'removed': removed, 'changed': changed}
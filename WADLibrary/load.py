@@ -0,0 +1,292 @@
+"""
+Load runner driving a scripted keyword flow with many concurrent synthetic users.
+
+Every user gets a library instance of its own, sets up a Root session on its driver endpoint and runs
+the steps of the flow in order, again and again, until it has done the given number of iterations or
+the duration is over. Users are started evenly over the ramp-up time and endpoints are handed out to
+them in turn, so several endpoints spread the users over several machines or driver instances.
+
+The flow is a JSON (or, with PyYAML, YAML) file. Steps name a keyword of the library either as in Robot
+tests or as the method name, with optional positional and named arguments. ${user} in a string argument
+is replaced with the number of the user, so that each user can work in a window of its own:
+| {"think_time": 0.5,
+|  "steps": [
+|    {"name": "attach", "keyword": "Attach To Window", "args": ["Calculator ${user}", "calc"]},
+|    {"keyword": "Click Element", "args": ["One"], "kwargs": {"using": "name"}},
+|    {"keyword": "Close Window"}]}
+
+A failing step ends the iteration of that user, which continues with the next iteration.
+
+Run it with:
+| python -m WADLibrary.load flow.json --users 10 --ramp-up 30 --duration 300 --report load.json
+
+The report holds latency percentiles and error rate of every step and the number of completed and
+failed steps in every interval of the run.
+"""
+import argparse
+import json
+import threading
+import time
+from .Keywords import Keywords
+from .common import execute
+from .common.errors import Error
+from .common.stats import percentile
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+USER_VARIABLE = '${user}'
+
+
+class Step:
+    """One keyword call of a flow."""
+    __slots__ = ('name', 'keyword', 'args', 'kwargs')
+
+    def __init__(self, keyword, args=(), kwargs=None, name=None):
+        self.keyword = keyword.strip().lower().replace(' ', '_')
+        if self.keyword.startswith('_') or not callable(getattr(Keywords, self.keyword, None)):
+            raise Error("Unknown keyword '%s' in load flow" % keyword)
+        self.name = name or keyword
+        self.args = list(args)
+        self.kwargs = dict(kwargs or {})
+
+    def run(self, library, user):
+        args = [_substitute(arg, user) for arg in self.args]
+        kwargs = {name: _substitute(value, user) for name, value in self.kwargs.items()}
+        return getattr(library, self.keyword)(*args, **kwargs)
+
+
+def load_flow(path):
+    """Reads a flow file and returns its steps and think time."""
+    with open(path, encoding='utf-8') as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise Error('Loading YAML load flows requires PyYAML: pip install pyyaml')
+            flow = yaml.safe_load(f)
+        else:
+            flow = json.load(f)
+    if isinstance(flow, list):
+        flow = {'steps': flow}
+    steps = [Step(step['keyword'], step.get('args', ()), step.get('kwargs'), step.get('name'))
+             for step in flow.get('steps', [])]
+    if not steps:
+        raise Error("Load flow '%s' has no steps" % path)
+    return steps, float(flow.get('think_time', 0.0))
+
+
+def _session_ids(endpoint):
+    try:
+        res = execute.get(endpoint + '/sessions', catch_error=False)
+        return {session['id'] for session in json.loads(res.text)['value']}
+    except (Error, ValueError, KeyError, TypeError):
+        return set()
+
+
+def _delete_sessions(library, session_ids):
+    for session_id in session_ids:
+        library.delete_session(session_id)
+
+
+def _substitute(value, user):
+    if isinstance(value, str):
+        return value.replace(USER_VARIABLE, str(user))
+    return value
+
+
+class LoadReport:
+    """Thread-safe record of step latencies, errors and throughput over time.
+
+    Arguments detailed:
+    | =Argument= | =Input=                                                      |
+    | interval   | Length in seconds of each throughput bucket                  |
+    """
+    def __init__(self, interval=1.0):
+        self.interval = float(interval)
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._errors = {}
+        self._messages = {}
+        self._buckets = {}
+
+    def record(self, step, started, elapsed, error=None):
+        bucket = int((started + elapsed - self.started) / self.interval)
+        with self._lock:
+            self._latencies.setdefault(step, []).append(elapsed)
+            counts = self._buckets.setdefault(bucket, {'completed': 0, 'errors': 0})
+            counts['completed'] += 1
+            if error is not None:
+                self._errors[step] = self._errors.get(step, 0) + 1
+                counts['errors'] += 1
+                messages = self._messages.setdefault(step, {})
+                messages[error] = messages.get(error, 0) + 1
+
+    def as_dict(self):
+        with self._lock:
+            latencies = {step: sorted(values) for step, values in self._latencies.items()}
+            errors = dict(self._errors)
+            messages = {step: dict(counts) for step, counts in self._messages.items()}
+            buckets = dict(self._buckets)
+        duration = time.time() - self.started
+        steps = {}
+        for step, values in latencies.items():
+            steps[step] = {
+                'count': len(values),
+                'errors': errors.get(step, 0),
+                'error_rate': errors.get(step, 0) / len(values),
+                'mean': sum(values) / len(values),
+                'p50': percentile(values, 50),
+                'p90': percentile(values, 90),
+                'p99': percentile(values, 99),
+                'max': values[-1],
+                'error_messages': messages.get(step, {}),
+            }
+        timeline = []
+        for bucket in range(max(buckets) + 1 if buckets else 0):
+            counts = buckets.get(bucket, {'completed': 0, 'errors': 0})
+            timeline.append({'time': bucket * self.interval, 'completed': counts['completed'],
+                             'errors': counts['errors'], 'throughput': counts['completed'] / self.interval})
+        completed = sum(len(values) for values in latencies.values())
+        return {'duration': duration, 'completed': completed, 'errors': sum(errors.values()),
+                'throughput': completed / duration if duration else 0.0, 'steps': steps, 'timeline': timeline}
+
+
+class LoadRunner:
+    """Runs a flow with concurrent synthetic users, each with a library instance and Root session of its own.
+
+    Arguments detailed:
+    | =Argument=  | =Input=                                                      |
+    | steps       | Steps of the flow, see load_flow                             |
+    | endpoints   | Driver urls, handed out to the users in turn                 |
+    | users       | Number of concurrent users                                   |
+    | ramp_up     | Seconds over which the users are started                     |
+    | iterations  | Times each user runs the flow, None to run until duration    |
+    | duration    | Seconds after which users stop starting new iterations       |
+    | think_time  | Seconds each user waits between steps                        |
+    | interval    | Length in seconds of each throughput bucket of the report    |
+    """
+    def __init__(self, steps, endpoints, users=1, ramp_up=0.0, iterations=1, duration=None, think_time=0.0,
+                 interval=1.0, platform='Windows', device_name='my_machine', timeout=30):
+        if iterations is None and duration is None:
+            raise Error('Load run needs iterations or duration to know when to stop')
+        self.steps = steps
+        self.endpoints = list(endpoints)
+        self.users = int(users)
+        self.ramp_up = float(ramp_up)
+        self.iterations = iterations
+        self.duration = duration
+        self.think_time = float(think_time)
+        self.interval = interval
+        self.platform = platform
+        self.device_name = device_name
+        self.timeout = timeout
+        self.report = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """Runs all users to completion and returns the report as a dict.
+
+        Sessions left on the endpoints when all users are done, such as the Root sessions of the
+        users, are deleted unless they existed before the run.
+        """
+        self.report = LoadReport(self.interval)
+        self._stop_event.clear()
+        existing = {endpoint: _session_ids(endpoint) for endpoint in set(self.endpoints)}
+        threads = []
+        for user in range(1, self.users + 1):
+            endpoint = self.endpoints[(user - 1) % len(self.endpoints)]
+            thread = threading.Thread(target=self._user, args=(user, endpoint), name='WADLibrary load user %d' % user,
+                                      daemon=True)
+            thread.start()
+            threads.append(thread)
+            if user < self.users and self.ramp_up:
+                if self._stop_event.wait(self.ramp_up / self.users):
+                    break
+        for thread in threads:
+            thread.join()
+        for endpoint, before in existing.items():
+            for session_id in _session_ids(endpoint) - before:
+                execute.delete(endpoint + '/session/' + session_id, catch_error=False)
+        return self.report.as_dict()
+
+    def stop(self):
+        """Makes the users stop after their current step."""
+        self._stop_event.set()
+
+    def _user(self, user, endpoint):
+        library = Keywords(endpoint, self.platform, self.device_name, self.timeout)
+        if not self._timed('set up', library.set_up):
+            return
+        # Users sharing an endpoint see each other's sessions, so each one only deletes the ones it created.
+        # Set up makes the Root session it created current, so each user works in a Root session of its own.
+        shared = set(library.get_session_ids()) - {library.get_current_session_id()}
+        try:
+            iteration = 0
+            while not self._done(iteration):
+                iteration += 1
+                for step in self.steps:
+                    if self._stop_event.is_set():
+                        return
+                    if not self._timed(step.name, step.run, library, user):
+                        break
+                    if self.think_time:
+                        self._stop_event.wait(self.think_time)
+        finally:
+            created = [session_id for session_id in library.get_session_ids() if session_id not in shared]
+            self._timed('clean up', _delete_sessions, library, created)
+
+    def _done(self, iteration):
+        if self._stop_event.is_set():
+            return True
+        if self.iterations is not None and iteration >= self.iterations:
+            return True
+        return self.duration is not None and time.time() - self.report.started >= self.duration
+
+    def _timed(self, name, func, *args):
+        start = time.time()
+        try:
+            func(*args)
+        except Exception as e:
+            self.report.record(name, start, time.time() - start, '%s: %s' % (type(e).__name__, e))
+            return False
+        self.report.record(name, start, time.time() - start)
+        return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a WADLibrary keyword flow with concurrent synthetic users')
+    parser.add_argument('flow', help='JSON or YAML file with the steps of the flow')
+    parser.add_argument('--endpoint', action='append', dest='endpoints',
+                        help='url of Windows Application Driver, can be given several times')
+    parser.add_argument('--users', type=int, default=1, help='number of concurrent users')
+    parser.add_argument('--ramp-up', type=float, default=0.0, help='seconds over which the users are started')
+    parser.add_argument('--iterations', type=int, default=None, help='times each user runs the flow')
+    parser.add_argument('--duration', type=float, default=None, help='seconds to keep starting new iterations')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds per throughput bucket')
+    parser.add_argument('--report', default=None, help='file the JSON report is written to')
+    args = parser.parse_args(argv)
+    steps, think_time = load_flow(args.flow)
+    iterations = args.iterations
+    if iterations is None and args.duration is None:
+        iterations = 1
+    runner = LoadRunner(steps, args.endpoints or ['http://127.0.0.1:4723'], args.users, args.ramp_up, iterations,
+                        args.duration, think_time, args.interval)
+    try:
+        report = runner.run()
+    except KeyboardInterrupt:
+        runner.stop()
+        report = runner.report.as_dict()
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    print('%d steps in %.1f s, %d errors, %.2f steps/s' % (report['completed'], report['duration'],
+                                                            report['errors'], report['throughput']))
+    for name, step in report['steps'].items():
+        print('%-30s n=%-6d err=%5.1f%% p50=%.3f p90=%.3f p99=%.3f' % (
+            name[:30], step['count'], step['error_rate'] * 100, step['p50'], step['p90'], step['p99']))
+
+
+if __name__ == '__main__':
+    main()
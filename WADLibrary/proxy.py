@@ -0,0 +1,318 @@
+"""
+Local multiplexing proxy for Windows Application Driver.
+
+Windows Application Driver handles one request at a time, so several Robot processes using the same
+driver directly contend for it unpredictably. The proxy accepts requests from all of them, queues them
+per worker and sends them upstream over one persistent connection, picking workers in turn so that no
+worker starves the others. Requests with a higher X-WAD-Priority header are sent first.
+
+All workers share one Root session: only the first Root session request reaches the driver, and
+deleting the Root session is ignored until the proxy stops. Listing sessions only returns the shared
+Root session and the sessions the asking worker created.
+
+Start the proxy and give its address as the library path:
+| python -m WADLibrary.proxy --upstream http://127.0.0.1:4723 --port 4724
+
+Queue depth and wait time metrics are served as JSON from /wad-proxy/metrics.
+"""
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from .common.stats import percentile
+
+WORKER_HEADER = 'X-WAD-Worker'
+PRIORITY_HEADER = 'X-WAD-Priority'
+METRICS_PATH = '/wad-proxy/metrics'
+
+
+class Job:
+    """A request waiting to be sent upstream."""
+    __slots__ = ('method', 'path', 'body', 'content_type', 'worker', 'priority', 'enqueued', 'done', 'response')
+
+    def __init__(self, method, path, body, content_type, worker, priority):
+        self.method = method
+        self.path = path
+        self.body = body
+        self.content_type = content_type
+        self.worker = worker
+        self.priority = priority
+        self.enqueued = time.time()
+        self.done = threading.Event()
+        self.response = None
+
+
+class FairQueue:
+    """Per-worker FIFO queues served round robin, highest priority first."""
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._queues = {}
+
+    def put(self, job):
+        with self._condition:
+            workers = self._queues.setdefault(job.priority, OrderedDict())
+            workers.setdefault(job.worker, deque()).append(job)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        with self._condition:
+            if not self._queues:
+                self._condition.wait(timeout)
+            if not self._queues:
+                return None
+            priority = max(self._queues)
+            workers = self._queues[priority]
+            worker, jobs = next(iter(workers.items()))
+            job = jobs.popleft()
+            # Move the worker to the back so the next worker with queued requests is served next
+            del workers[worker]
+            if jobs:
+                workers[worker] = jobs
+            if not workers:
+                del self._queues[priority]
+            return job
+
+    def depth(self):
+        with self._condition:
+            depths = {}
+            for workers in self._queues.values():
+                for worker, jobs in workers.items():
+                    depths[worker] = depths.get(worker, 0) + len(jobs)
+            return depths
+
+
+class Proxy:
+    """Queues requests of all workers and sends them to the driver one at a time.
+
+    Arguments detailed:
+    | =Argument=  | =Input=                                                   |
+    | upstream    | Url of Windows Application Driver                         |
+    | connections | Number of requests sent to the driver at the same time    |
+    | window      | Number of recent wait times kept for the metrics          |
+    """
+    def __init__(self, upstream, connections=1, window=1000):
+        self.upstream = upstream.rstrip('/')
+        self.queue = FairQueue()
+        self.connections = connections
+        self.root_session = None
+        self.owners = {}
+        self.waits = deque(maxlen=window)
+        self.counters = {'requests': 0, 'upstream_requests': 0, 'shared_root_hits': 0, 'upstream_errors': 0}
+        self._lock = threading.Lock()
+        # Set while the first Root session is being created, later Root requests wait for it
+        self._root_pending = None
+        self._running = False
+        self._threads = []
+
+    def start(self):
+        self._running = True
+        for i in range(self.connections):
+            thread = threading.Thread(target=self._dispatch, name='WADLibrary proxy %d' % i, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join(2)
+        if self.root_session is not None:
+            try:
+                requests.delete(self.upstream + '/session/' + self.root_session['sessionId'], timeout=10)
+            except requests.RequestException:
+                pass
+
+    def handle(self, job):
+        """Returns (status, content type, body) for a request, queueing it unless it can be answered locally."""
+        with self._lock:
+            self.counters['requests'] += 1
+        local = self._answer_locally(job)
+        if local is not None:
+            return local
+        try:
+            self.queue.put(job)
+            job.done.wait()
+            status, content_type, body = job.response
+            self._track_sessions(job, status, body)
+            return job.response
+        finally:
+            if _is_root_creation(job):
+                with self._lock:
+                    pending, self._root_pending = self._root_pending, None
+                pending.set()
+
+    def metrics(self):
+        with self._lock:
+            waits = sorted(self.waits)
+            result = dict(self.counters)
+        depths = self.queue.depth()
+        result['queue_depth'] = sum(depths.values())
+        result['queue_depth_per_worker'] = depths
+        result['wait_time'] = {
+            'count': len(waits),
+            'mean': sum(waits) / len(waits) if waits else 0.0,
+            'p50': percentile(waits, 50),
+            'p95': percentile(waits, 95),
+            'max': waits[-1] if waits else 0.0,
+        }
+        return result
+
+    def _dispatch(self):
+        session = requests.Session()
+        while self._running:
+            job = self.queue.get(timeout=0.5)
+            if job is None:
+                continue
+            with self._lock:
+                self.waits.append(time.time() - job.enqueued)
+                self.counters['upstream_requests'] += 1
+            headers = {'Content-Type': job.content_type} if job.content_type else {}
+            try:
+                res = session.request(job.method, self.upstream + job.path, data=job.body, headers=headers,
+                                      timeout=120)
+                job.response = (res.status_code, res.headers.get('Content-Type', 'application/json'), res.content)
+            except requests.RequestException as e:
+                with self._lock:
+                    self.counters['upstream_errors'] += 1
+                job.response = (502, 'text/plain', str(e).encode('utf-8'))
+            job.done.set()
+
+    def _answer_locally(self, job):
+        """Returns the response to a request that is not sent to the driver, or None.
+
+        A Root session request made while the first Root session is being created waits for it and
+        gets the same session. Returning None for a Root session request makes it the one creating it.
+        """
+        path = job.path.rstrip('/')
+        root_creation = _is_root_creation(job)
+        while True:
+            with self._lock:
+                root = self.root_session
+                if root_creation and root is not None:
+                    self.counters['shared_root_hits'] += 1
+                    return 200, 'application/json', json.dumps(root).encode('utf-8')
+                if root_creation and self._root_pending is None:
+                    self._root_pending = threading.Event()
+                    return None
+                if job.method == 'DELETE' and root is not None and path == '/session/' + root['sessionId']:
+                    return 200, 'application/json', json.dumps({'sessionId': root['sessionId'], 'status': 0,
+                                                                'value': None}).encode('utf-8')
+                pending = self._root_pending if root_creation else None
+            if pending is None:
+                return None
+            # If creating the session failed, the next waiting request tries again
+            pending.wait()
+
+    def _track_sessions(self, job, status, body):
+        path = job.path.rstrip('/')
+        if status != 200:
+            return
+        if job.method == 'POST' and path == '/session':
+            try:
+                created = json.loads(body.decode('utf-8'))
+            except ValueError:
+                return
+            with self._lock:
+                if _is_root_request(job.body):
+                    if self.root_session is None:
+                        self.root_session = created
+                else:
+                    self.owners[created.get('sessionId')] = job.worker
+        elif job.method == 'GET' and path == '/sessions':
+            try:
+                listing = json.loads(body.decode('utf-8'))
+            except ValueError:
+                return
+            with self._lock:
+                root_id = self.root_session['sessionId'] if self.root_session else None
+                listing['value'] = [session for session in listing.get('value', [])
+                                    if session.get('id') == root_id or self.owners.get(session.get('id')) == job.worker]
+            job.response = (status, 'application/json', json.dumps(listing).encode('utf-8'))
+        elif job.method == 'DELETE' and path.count('/') == 2:
+            with self._lock:
+                self.owners.pop(path.rsplit('/', 1)[1], None)
+
+
+def _is_root_creation(job):
+    return job.method == 'POST' and job.path.rstrip('/') == '/session' and _is_root_request(job.body)
+
+
+def _is_root_request(body):
+    try:
+        caps = json.loads(body.decode('utf-8'))['desiredCapabilities']
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return False
+    return caps.get('app') == 'Root'
+
+
+def make_handler(proxy):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _respond(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _forward(self, method):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else None
+            if method == 'GET' and self.path == METRICS_PATH:
+                return self._respond(200, 'application/json', json.dumps(proxy.metrics()).encode('utf-8'))
+            worker = self.headers.get(WORKER_HEADER) or self.client_address[0]
+            try:
+                priority = int(self.headers.get(PRIORITY_HEADER) or 0)
+            except ValueError:
+                priority = 0
+            job = Job(method, self.path, body, self.headers.get('Content-Type'), worker, priority)
+            self._respond(*proxy.handle(job))
+
+        def do_GET(self):
+            self._forward('GET')
+
+        def do_POST(self):
+            self._forward('POST')
+
+        def do_DELETE(self):
+            self._forward('DELETE')
+
+    return Handler
+
+
+def serve(upstream, host='127.0.0.1', port=4724, connections=1):
+    """Starts the proxy in background threads and returns the server and the proxy."""
+    proxy = Proxy(upstream, connections)
+    proxy.start()
+    server = ThreadingHTTPServer((host, port), make_handler(proxy))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='WADLibrary proxy server', daemon=True).start()
+    return server, proxy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Multiplexing proxy for Windows Application Driver')
+    parser.add_argument('--upstream', default='http://127.0.0.1:4723', help='url of Windows Application Driver')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=4724, help='port to listen on')
+    parser.add_argument('--connections', type=int, default=1, help='parallel requests sent to the driver')
+    args = parser.parse_args(argv)
+    server, proxy = serve(args.upstream, args.host, args.port, args.connections)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        proxy.stop()
+
+
+if __name__ == '__main__':
+    main()
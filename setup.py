@@ -13,6 +13,7 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/Adwisit/WADLibrary",
     install_requires = ['robotframework', 'requests', 'psutil'],
+    extras_require = {'yaml': ['PyYAML']},
     packages=setuptools.find_packages(),
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -0,0 +1,113 @@
+import json
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubDriver:
+    """Stand-in for Windows Application Driver serving the JSON wire protocol on a local port.
+
+    Elements are looked up by their locator value in elements. Requests are recorded as
+    (method, path) in requests. A handler registered in overrides for (method, path pattern) is
+    called with the request body instead and returns (HTTP status, body) or None for the default.
+    """
+    def __init__(self, elements=None):
+        self.elements = dict(elements or {'One': 'e1'})
+        self.attributes = {}
+        self.sessions = {}
+        self.requests = []
+        self.overrides = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _handler(self))
+        self._server.daemon_threads = True
+        self.url = 'http://127.0.0.1:%d' % self._server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, method, pattern):
+        with self._lock:
+            return len([1 for m, path in self.requests if m == method and re.search(pattern, path)])
+
+    def respond(self, method, path, body):
+        with self._lock:
+            self.requests.append((method, path))
+        for (override_method, pattern), handler in list(self.overrides.items()):
+            if override_method == method and re.search(pattern, path):
+                response = handler(body)
+                if response is not None:
+                    return response
+        if path == '/status':
+            return 200, {'build': {'version': 'stub'}}
+        if path == '/session' and method == 'POST':
+            session_id = str(uuid.uuid4())
+            with self._lock:
+                self.sessions[session_id] = body['desiredCapabilities']
+            return 200, ok(body['desiredCapabilities'], session_id)
+        if path == '/sessions':
+            with self._lock:
+                listing = [{'id': session_id, 'capabilities': caps} for session_id, caps in self.sessions.items()]
+            return 200, ok(listing)
+        match = re.match(r'^/session/([^/]+)(.*)$', path)
+        if match is None:
+            return 404, error(9, 'unknown command')
+        session_id, rest = match.groups()
+        with self._lock:
+            if session_id not in self.sessions:
+                return 404, error(6, 'no such session')
+            if rest == '' and method == 'DELETE':
+                del self.sessions[session_id]
+                return 200, ok(None, session_id)
+        if re.match(r'^(/element/[^/]+)?/element$', rest):
+            if body['value'] in self.elements:
+                return 200, ok({'ELEMENT': self.elements[body['value']]}, session_id)
+            return 404, error(7, 'no such element')
+        match = re.match(r'^/element/([^/]+)/attribute/(.+)$', rest)
+        if match:
+            return 200, ok(self.attributes.get(match.groups(), ''), session_id)
+        if re.match(r'^/element/[^/]+/enabled$', rest):
+            return 200, ok(True, session_id)
+        if rest == '/window_handle':
+            return 200, ok('0x1', session_id)
+        return 200, ok(None, session_id)
+
+
+def ok(value, session_id=None):
+    return {'status': 0, 'sessionId': session_id, 'value': value}
+
+
+def error(status, message):
+    return {'status': status, 'value': {'error': message, 'message': message}}
+
+
+def _handler(driver):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _handle(self, method):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'null') if length else None
+            status, response = driver.respond(method, self.path.rstrip('/'), body)
+            content = response if isinstance(response, bytes) else json.dumps(response).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self):
+            self._handle('GET')
+
+        def do_POST(self):
+            self._handle('POST')
+
+        def do_DELETE(self):
+            self._handle('DELETE')
+    return Handler
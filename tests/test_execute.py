@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+import unittest
+from stub_driver import StubDriver, error, ok
+from WADLibrary.common import execute
+from WADLibrary.common.deadline import deadline
+from WADLibrary.common.errors import CircuitOpenError, DeadlineExceeded, DeferredCommandError, Error
+from WADLibrary.common.retry import RetryPolicy
+
+
+class TransportTest(unittest.TestCase):
+    def setUp(self):
+        self.driver = StubDriver().start()
+        self.saved = execute.policy, dict(execute.breaker_settings)
+        execute.policy = RetryPolicy(attempts=3, backoff=0.01)
+        execute.reset_breakers()
+
+    def tearDown(self):
+        execute.policy, settings = self.saved
+        execute.breaker_settings.update(settings)
+        execute.reset_breakers()
+        execute.pipeline.enabled = False
+        execute.coalesce = False
+        self.driver.stop()
+
+    def fail(self, method, pattern, times, response):
+        left = [times]
+
+        def handler(body):
+            if left[0] > 0:
+                left[0] -= 1
+                return response
+        self.driver.overrides[(method, pattern)] = handler
+
+    def test_unknown_error_is_retried(self):
+        self.fail('GET', '/status', 2, (500, error(13, 'unknown error')))
+        res = execute.send('GET', self.driver.url + '/status', idempotent=True)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.driver.count('GET', '/status'), 3)
+
+    def test_webdriver_errors_are_final(self):
+        self.fail('GET', '/status', 1, (500, error(7, 'no such element')))
+        res = execute.send('GET', self.driver.url + '/status', idempotent=True)
+        self.assertEqual(res.status_code, 500)
+        self.assertEqual(self.driver.count('GET', '/status'), 1)
+
+    def test_non_idempotent_requests_are_not_retried(self):
+        self.fail('POST', '/status', 1, (500, error(13, 'unknown error')))
+        res = execute.send('POST', self.driver.url + '/status', json={})
+        self.assertEqual(res.status_code, 500)
+        self.assertEqual(self.driver.count('POST', '/status'), 1)
+
+    def test_exhausted_retries_return_last_response(self):
+        self.fail('GET', '/status', 5, (503, b''))
+        res = execute.send('GET', self.driver.url + '/status', idempotent=True)
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(self.driver.count('GET', '/status'), 3)
+
+    def test_connection_errors_are_raised(self):
+        self.driver.stop()
+        with self.assertRaises(Error):
+            execute.send('GET', self.driver.url + '/status', idempotent=True)
+
+    def test_breaker_opens_and_recovers_through_half_open(self):
+        execute.breaker_settings.update({'failure_threshold': 2, 'reset_timeout': 0.3})
+        execute.reset_breakers()
+        execute.policy = RetryPolicy(attempts=1)
+        self.fail('GET', '/status', 2, (503, b''))
+        for _ in range(2):
+            execute.send('GET', self.driver.url + '/status', idempotent=True)
+        with self.assertRaises(CircuitOpenError):
+            execute.send('GET', self.driver.url + '/status', idempotent=True)
+        self.assertEqual(self.driver.count('GET', '/status'), 2)
+        time.sleep(0.3)
+        # The trial request after the reset timeout succeeds and closes the circuit
+        self.assertEqual(execute.send('GET', self.driver.url + '/status', idempotent=True).status_code, 200)
+        self.assertEqual(execute.breaker_for(self.driver.url).state, 'closed')
+
+    def test_failed_trial_opens_breaker_again(self):
+        execute.breaker_settings.update({'failure_threshold': 1, 'reset_timeout': 0.2})
+        execute.reset_breakers()
+        execute.policy = RetryPolicy(attempts=1)
+        self.fail('GET', '/status', 2, (503, b''))
+        execute.send('GET', self.driver.url + '/status', idempotent=True)
+        time.sleep(0.2)
+        execute.send('GET', self.driver.url + '/status', idempotent=True)
+        self.assertEqual(execute.breaker_for(self.driver.url).state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            execute.send('GET', self.driver.url + '/status', idempotent=True)
+
+    def test_barrier_raises_error_of_deferred_command_once(self):
+        execute.pipeline.enabled = True
+        self.driver.sessions['s1'] = {'app': 'Root'}
+        self.fail('POST', '/keys', 1, (404, error(7, 'no such element')))
+        self.assertIsNone(execute.post(self.driver.url + '/session/s1/keys', json={}, deferred=True))
+        with self.assertRaises(DeferredCommandError):
+            execute.get(self.driver.url + '/session/s1/window_handle')
+        self.assertEqual(json.loads(execute.get(self.driver.url + '/session/s1/window_handle').text)['value'], '0x1')
+
+    def test_deferred_commands_are_sent_in_order(self):
+        execute.pipeline.enabled = True
+        self.driver.sessions['s1'] = {'app': 'Root'}
+        for index in range(5):
+            execute.post(self.driver.url + '/session/s1/keys/%d' % index, json={}, deferred=True)
+        execute.pipeline.barrier()
+        sent = [path for method, path in self.driver.requests if method == 'POST']
+        self.assertEqual(sent, ['/session/s1/keys/%d' % index for index in range(5)])
+
+    def test_identical_reads_in_flight_are_coalesced(self):
+        execute.coalesce = True
+        self.driver.overrides[('GET', '/slow')] = lambda body: time.sleep(0.3) or (200, ok('value'))
+        threads = [threading.Thread(target=execute.get, args=(self.driver.url + '/slow',)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.driver.count('GET', '/slow'), 1)
+
+    def test_deadline_cuts_request_short(self):
+        self.driver.overrides[('GET', '/slow')] = lambda body: time.sleep(1) or (200, ok('value'))
+        start = time.time()
+        with self.assertRaises(DeadlineExceeded):
+            with deadline(time.time() + 0.3):
+                execute.get(self.driver.url + '/slow')
+        self.assertLess(time.time() - start, 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
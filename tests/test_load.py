@@ -0,0 +1,25 @@
+import re
+import unittest
+from stub_driver import StubDriver
+from WADLibrary.load import LoadRunner, Step
+
+
+class LoadRunnerTest(unittest.TestCase):
+    def setUp(self):
+        self.driver = StubDriver({'One': 'e1'}).start()
+
+    def tearDown(self):
+        self.driver.stop()
+
+    def test_users_work_in_root_sessions_of_their_own(self):
+        runner = LoadRunner([Step('Click Element', ['One'])], [self.driver.url], users=3, iterations=2)
+        report = runner.run()
+        self.assertEqual(report['errors'], 0)
+        used = {re.match(r'^/session/([^/]+)/element$', path).group(1) for method, path in self.driver.requests
+                if method == 'POST' and re.match(r'^/session/[^/]+/element$', path)}
+        self.assertEqual(len(used), 3)
+        self.assertEqual(self.driver.sessions, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from stub_driver import StubDriver
+from WADLibrary import WADLibrary
+
+
+class ReadCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.driver = StubDriver({'One': 'e1', 'Calculator': 'w1'}).start()
+        self.driver.attributes[('e1', 'Value.Value')] = '0'
+        self.driver.attributes[('w1', 'NativeWindowHandle')] = '4096'
+        self.library = WADLibrary(self.driver.url)
+        self.library.set_up()
+        self.library.enable_read_cache()
+        self.root = self.library.get_session('Root').get_id()
+
+    def tearDown(self):
+        self.driver.stop()
+
+    def read_root(self):
+        return self.library.get_element_attribute('One', 'Value.Value', session_id=self.root)
+
+    def test_repeated_reads_are_cached(self):
+        self.read_root()
+        self.read_root()
+        self.assertEqual(self.driver.count('GET', r'/attribute/Value.Value$'), 1)
+
+    def test_action_in_other_session_clears_root_reads(self):
+        self.library.attach_to_window('Calculator', 'Calc')
+        self.assertEqual(self.read_root(), '0')
+        self.driver.attributes[('e1', 'Value.Value')] = '1'
+        self.library.click_element('One')
+        self.assertEqual(self.read_root(), '1')
+
+    def test_wait_clears_cached_reads(self):
+        self.assertEqual(self.read_root(), '0')
+        self.driver.attributes[('e1', 'Value.Value')] = '1'
+        self.library.wait_until_element_is_visible('One', timeout=1)
+        self.assertEqual(self.read_root(), '1')
+
+
+if __name__ == '__main__':
+    unittest.main()
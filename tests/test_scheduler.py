@@ -0,0 +1,71 @@
+import gc
+import unittest
+import weakref
+from stub_driver import StubDriver
+from WADLibrary import WADLibrary
+from WADLibrary.common import execute, scheduler
+from WADLibrary.common.scheduler import EndpointScheduler
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.drivers = [StubDriver({'Calculator': 'w1'}).start() for _ in range(2)]
+        for driver in self.drivers:
+            driver.attributes[('w1', 'NativeWindowHandle')] = '4096'
+        self.urls = [driver.url for driver in self.drivers]
+
+    def tearDown(self):
+        for driver in self.drivers:
+            driver.stop()
+
+    def test_acquire_picks_endpoint_with_fewest_open_sessions(self):
+        self.drivers[0].sessions.update({'a': {'app': 'Root'}, 'b': {'app': 'Root'}})
+        self.assertEqual(EndpointScheduler(self.urls).acquire(), self.urls[1])
+
+    def test_fresh_instances_spread_over_endpoints(self):
+        for _ in range(2):
+            WADLibrary(','.join(self.urls)).set_up()
+        self.assertEqual([len(driver.sessions) for driver in self.drivers], [1, 1])
+
+    def test_unreachable_endpoint_comes_last(self):
+        self.drivers[0].stop()
+        self.drivers[1].sessions.update({'a': {'app': 'Root'}})
+        self.assertEqual(EndpointScheduler(self.urls).acquire(), self.urls[1])
+
+    def test_sessions_stay_on_their_endpoint(self):
+        self.drivers[0].sessions.update({'a': {'app': 'Root'}})
+        library = WADLibrary(','.join(self.urls))
+        library.set_up()
+        before = len(self.drivers[0].requests)
+        library.attach_to_window('Calculator', 'Calc')
+        calc = library.get_session('Calc').get_id()
+        self.assertEqual(library._endpoint(calc), self.urls[1])
+        self.assertIn(calc, self.drivers[1].sessions)
+        self.assertEqual(len(self.drivers[0].requests), before)
+
+    def test_released_sessions_unbind(self):
+        schedule = EndpointScheduler(self.urls)
+        schedule.bind('s1', self.urls[0])
+        self.assertEqual(schedule.endpoint_for('s1'), self.urls[0])
+        schedule.release('s1')
+        self.assertIsNone(schedule.endpoint_for('s1'))
+        self.assertEqual(schedule.statistics()[0]['sessions'], 0)
+
+    def test_failed_requests_mark_endpoint_unhealthy(self):
+        schedule = EndpointScheduler(self.urls, max_failures=2)
+        for _ in range(2):
+            schedule.record('GET', self.urls[0] + '/status', 0.1, False)
+        self.assertFalse(schedule.statistics()[0]['healthy'])
+        self.assertEqual(schedule.acquire(), self.urls[1])
+        schedule.check_health()
+        self.assertTrue(schedule.statistics()[0]['healthy'])
+
+    def test_schedulers_of_dropped_instances_are_released(self):
+        schedules = [weakref.ref(WADLibrary(','.join(self.urls))._scheduler) for _ in range(3)]
+        gc.collect()
+        self.assertEqual(execute.listeners.count(scheduler.record_request), 1)
+        self.assertEqual([schedule() for schedule in schedules], [None, None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
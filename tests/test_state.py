@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+import psutil
+from stub_driver import StubDriver, error
+from WADLibrary import WADLibrary
+from WADLibrary.common.state import save_state
+
+
+class StateTest(unittest.TestCase):
+    def setUp(self):
+        self.driver = StubDriver({'Calculator': 'w1'}).start()
+        self.driver.attributes[('w1', 'NativeWindowHandle')] = '4096'
+        self.directory = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.directory, 'state.json')
+
+    def tearDown(self):
+        self.driver.stop()
+        shutil.rmtree(self.directory)
+
+    def save(self, sessions):
+        # The test process stands in for the saved driver process, so that it counts as alive
+        save_state(self.state_file, {'endpoint': self.driver.url, 'sessions': sessions,
+                                     'driver_pid': os.getpid(),
+                                     'driver_created': psutil.Process(os.getpid()).create_time()})
+
+    def library(self):
+        return WADLibrary(self.driver.url, state_file=self.state_file)
+
+    def test_closed_windows_are_left_out(self):
+        first = WADLibrary(self.driver.url)
+        first.set_up()
+        first.attach_to_window('Calculator', 'Calc')
+        calc = first.get_session('Calc').get_id()
+        self.save(first._session_state()['sessions'])
+        self.driver.overrides[('GET', '/session/%s/window_handle$' % calc)] = \
+            lambda body: (404, error(23, 'no such window'))
+        library = self.library()
+        self.assertTrue(library.adopt_wadlibrary_state())
+        self.assertIsNone(library.get_session('Calc'))
+        self.assertEqual(library.get_current_session_id(), library.get_session('Root').get_id())
+
+    def test_live_driver_is_kept_when_sessions_are_gone(self):
+        self.save([{'id': 'gone', 'name': 'Root', 'caps': {'app': 'Root'}}])
+        library = self.library()
+        library.wadlibrary_set_up()
+        self.assertEqual(library.process.pid, os.getpid())
+        self.assertIsNotNone(library.get_session('Root'))
+        self.assertEqual(self.driver.count('POST', r'^/session$'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
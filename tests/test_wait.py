@@ -0,0 +1,29 @@
+import unittest
+from stub_driver import StubDriver
+from WADLibrary import WADLibrary
+
+
+class WaitTest(unittest.TestCase):
+    def setUp(self):
+        self.driver = StubDriver({'One': 'e1'}).start()
+        self.library = WADLibrary(self.driver.url)
+        self.library.set_up()
+
+    def tearDown(self):
+        self.driver.stop()
+
+    def test_zero_timeout_checks_once(self):
+        self.library.wait_until_element_is_visible('One', timeout=0)
+        self.assertEqual(self.driver.count('POST', r'/element$'), 1)
+
+    def test_zero_timeout_fails_after_one_check(self):
+        with self.assertRaises(AssertionError):
+            self.library.wait_until_element_is_visible('Two', timeout=0)
+        self.assertEqual(self.driver.count('POST', r'/element$'), 1)
+
+    def test_timeout_given_as_string(self):
+        self.library.wait_until_element_is_visible('One', timeout='0.01')
+
+
+if __name__ == '__main__':
+    unittest.main()